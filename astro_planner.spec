@@ -12,7 +12,7 @@ a = Analysis([
     pathex=[],
     binaries=[],
     datas=datas,
-    hiddenimports=[],
+    hiddenimports=['planner_render', 'page_preview', 'planner_archive', 'day_model'],
     hookspath=[],
     runtime_hooks=[],
     excludes=[],
@@ -0,0 +1,408 @@
+"""
+Benchmarks for the Astro Planner Python pipeline.
+
+Times text parsing, schema validation, each page's story builder, the
+reportlab layout/build and the end-to-end CLI over synthetic day documents
+(minimal, the sample day and two oversized days), then writes ops/sec,
+p50/p99 latency, peak memory and output size per benchmark as JSON:
+
+    python bench_planner.py --output bench.json
+    python bench_planner.py --baseline bench.json --max-regression 0.2
+
+The startup/* benchmarks time fresh interpreters for the entry points
+(generator --help, a validation-only run, a render worker's imports) and
+keep the slowest imports from -X importtime for each. With
+--startup-budget-ms, any of them slower than the budget fails the run.
+
+In-process benchmarks report peak_alloc_kb, the tracemalloc peak of one
+extra call measured on its own; CLI and startup benchmarks report the
+peak_rss_kb of their child processes.
+
+With --baseline, any benchmark whose p50 is slower than the baseline by more
+than --max-regression (a fraction) and by at least --min-delta-ms is
+reported and the exit status is 1; the floor keeps timer noise on
+sub-millisecond benchmarks from failing the run.
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_PATH = os.path.join(BASE_DIR, 'samples', 'today_input.json')
+GENERATOR = os.path.join(BASE_DIR, 'generate_planner_pdf.py')
+SCHEMA_PATH = os.path.join(BASE_DIR, 'schema.json')
+
+# Fresh-interpreter entry points for the startup/* benchmarks.
+STARTUP_COMMANDS = {
+    "generate_help": [GENERATOR, '--help'],
+    "validate_only": [os.path.join(BASE_DIR, 'validate_json.py'), SAMPLE_PATH, SCHEMA_PATH],
+    "render_worker_imports": ['-c', 'import planner_render; planner_render.get_styles(); planner_render.get_page_templates()'],
+}
+
+# Entries per list field (transit_summary, upcoming_events, task_list,
+# chores.avoid) for the synthetic sizes; None keeps the sample as is.
+SIZES = {
+    "minimal": 0,
+    "sample": None,
+    "large": 100,
+    "huge": 400,
+}
+
+
+def _maxrss_kb(usage):
+    # ru_maxrss is kilobytes on Linux but bytes on macOS.
+    return usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+
+
+# Runs a child's command and writes its VmHWM to $PLANNER_BENCH_PEAK at exit.
+# ru_maxrss from wait4 is no use here: Linux carries the parent's high-water
+# mark over fork and exec, so every child reported the benchmark's own peak.
+_PEAK_PROBE = """\
+import atexit, os, runpy, sys
+def _report():
+    with open('/proc/self/status') as f:
+        peak = next(line.split()[1] for line in f if line.startswith('VmHWM:'))
+    with open(os.environ['PLANNER_BENCH_PEAK'], 'w') as f:
+        f.write(peak)
+atexit.register(_report)
+if sys.argv[1] == '-c':
+    code, sys.argv = sys.argv[2], ['-c'] + sys.argv[3:]
+    exec(compile(code, '<string>', 'exec'), {'__name__': '__main__'})
+else:
+    sys.argv = sys.argv[1:]
+    sys.path[0] = os.path.dirname(os.path.abspath(sys.argv[0]))
+    runpy.run_path(sys.argv[0], run_name='__main__')
+"""
+
+
+def _peak_alloc_kb(fn):
+    """Peak Python heap allocation of one fn() call, in KB."""
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        fn()
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+def _grow(items, count):
+    if not items:
+        return []
+    return [copy.deepcopy(items[i % len(items)]) for i in range(count)]
+
+
+def make_document(size, sample=None):
+    """Return a synthetic day document for one of SIZES."""
+    if sample is None:
+        with open(SAMPLE_PATH, 'r', encoding='utf-8') as f:
+            sample = json.load(f)
+    count = SIZES[size]
+    if count is None:
+        return copy.deepcopy(sample)
+    if count == 0:
+        return {key: sample[key] for key in ("date", "moon_phase_sign", "day_planet")}
+    doc = copy.deepcopy(sample)
+    h = doc.setdefault("horoscope", {})
+    for key in ("transit_summary", "upcoming_events", "task_list"):
+        h[key] = _grow(h.get(key, []), count)
+    chores = doc.setdefault("chores", {})
+    chores["avoid"] = _grow(chores.get("avoid", []), count)
+    return doc
+
+
+def make_checkin_text(doc):
+    """Return daily check-in text (the text_to_json input format) sized like doc."""
+    checklist = doc.get("rituals", {}).get("checklist", {})
+    h = doc.get("horoscope", {})
+    events = h.get("upcoming_events", [])
+    flow = h.get("creative_flow", {})
+    kitchen = doc.get("kitchen", {})
+    lines = [
+        f"Date: {doc['date']}",
+        f"Moon Phase & Sign: {doc['moon_phase_sign']}",
+        f"Day Planet: {doc['day_planet']}",
+        "",
+        "Ritual Kit:",
+        f"Candle: {checklist.get('candle', '-')}",
+        f"Oil: {checklist.get('oil', '-')}",
+        f"Crystal: {checklist.get('crystal', '-')}",
+        f"Herb: {checklist.get('herb_incense', '-')}",
+        f"Mini Ritual: {doc.get('rituals', {}).get('notes', '-')}",
+        "",
+        "Upcoming Events (You-Only):",
+        "Transit Notes: " + " ".join(h.get("transit_summary", [])[:1] or ["-"]),
+        "Reflection: " + " ".join(e["text"] for e in events[:1]) if events else "Reflection: -",
+        "",
+        "Housewitch Chore of the Day:",
+    ]
+    lines += [f"[{e['when']}] {e['text']}" for e in events]
+    lines += [f"[avoid] {item}" for item in doc.get("chores", {}).get("avoid", [])]
+    lines += [
+        "",
+        "Kitchen Witch Tip:",
+        f"Idea: {kitchen.get('breakfast', '-')}",
+        f"Ingredient: {kitchen.get('tea_of_day', '-')}",
+        f"Treat: {kitchen.get('snack_prep', '-')}",
+        f"Notes: {kitchen.get('notes', '')}",
+        "",
+        "Creative Flow of the Day:",
+        f"Project: {flow.get('project', '-')}",
+        f"Mode: {flow.get('mode', '-')}",
+        f"Time Box: {flow.get('time_box', '-')}",
+        f"Bonus: {flow.get('bonus', '-')}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _percentile(sorted_values, fraction):
+    # Nearest-rank percentile.
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_benchmark(fn, min_time, min_runs=3, max_runs=1000, measure_memory=True):
+    """Call fn() until min_time seconds and min_runs calls have passed.
+
+    fn may return (seconds, output bytes) to report its own timing (e.g. to
+    leave setup out); otherwise the whole call is timed. With measure_memory,
+    one more untimed call records peak_alloc_kb. Returns the stats dict.
+    """
+    fn()  # warm-up: imports, font and style caches
+    timings = []
+    output_bytes = None
+    started = time.perf_counter()
+    while len(timings) < max_runs and (len(timings) < min_runs or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        if isinstance(result, tuple):
+            elapsed, output_bytes = result
+        timings.append(elapsed)
+    timings.sort()
+    mean = sum(timings) / len(timings)
+    stats = {
+        "runs": len(timings),
+        "ops_per_sec": 1.0 / mean if mean else None,
+        "p50_ms": _percentile(timings, 0.50) * 1000.0,
+        "p99_ms": _percentile(timings, 0.99) * 1000.0,
+        "output_bytes": output_bytes,
+    }
+    if measure_memory:
+        stats["peak_alloc_kb"] = _peak_alloc_kb(fn)
+    return stats
+
+
+def _process_runner(args, output_path=None):
+    can_probe = os.path.exists('/proc/self/status')
+
+    def run():
+        # The first call (run_benchmark's untimed warm-up) measures the peak;
+        # the timed runs start the command bare.
+        probe = can_probe and run.peak_rss_kb is None
+        # stderr goes to a file, not a pipe: nothing reads it while wait4 blocks.
+        with tempfile.TemporaryFile() as stderr, tempfile.TemporaryDirectory(prefix='planner-bench-') as tmp:
+            env = dict(os.environ, PLANNER_BENCH_PEAK=os.path.join(tmp, 'peak'))
+            command = [sys.executable, '-c', _PEAK_PROBE] + args if probe else [sys.executable] + args
+            t0 = time.perf_counter()
+            proc = subprocess.Popen(command, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=stderr)
+            _, status, usage = os.wait4(proc.pid, 0)
+            elapsed = time.perf_counter() - t0
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            if proc.returncode:
+                stderr.seek(0)
+                raise RuntimeError(f"{args[0]} exited with {proc.returncode}: {stderr.read().decode(errors='replace')}")
+            if probe:
+                with open(env['PLANNER_BENCH_PEAK'], 'r') as f:
+                    run.peak_rss_kb = int(f.read())
+            elif not can_probe:
+                run.peak_rss_kb = max(run.peak_rss_kb or 0, _maxrss_kb(usage))
+        return elapsed, os.path.getsize(output_path) if output_path else None
+    run.peak_rss_kb = None
+    return run
+
+
+def _cli_runner(input_path, output_path):
+    return _process_runner([GENERATOR, '--input', input_path, '--output', output_path], output_path)
+
+
+def import_times(args, top=10):
+    """Run args under -X importtime; returns [(module, cumulative ms)] for the slowest top-level imports."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=BASE_DIR,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    modules = []
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"; nested imports are indented.
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit() or name.startswith('  '):
+            continue
+        modules.append((name.strip(), int(cumulative) / 1000.0))
+    modules.sort(key=lambda m: m[1], reverse=True)
+    return modules[:top]
+
+
+def run_startup(runs=5, only=None):
+    """Time each STARTUP_COMMANDS entry in fresh interpreters; returns {name: stats}."""
+    results = {}
+    for key, args in STARTUP_COMMANDS.items():
+        name = f"startup/{key}"
+        if only and not any(pattern in name for pattern in only):
+            continue
+        runner = _process_runner(args)
+        stats = run_benchmark(runner, min_time=0, min_runs=runs, measure_memory=False)
+        stats["peak_rss_kb"] = runner.peak_rss_kb
+        stats["top_imports"] = [[module, round(ms, 2)] for module, ms in import_times(args)]
+        results[name] = stats
+        print(f"{name:42} {stats['ops_per_sec']:10.1f} ops/s  p50 {stats['p50_ms']:9.2f} ms  "
+              f"p99 {stats['p99_ms']:9.2f} ms  ({stats['runs']} runs)", file=sys.stderr)
+    return results
+
+
+def collect_benchmarks(sizes, include_cli=True):
+    """Yield (benchmark name, callable, is_cli) for every stage and size."""
+    import planner_render as gp
+    from text_to_json import parse_text
+    from validate_json import validate_json, load_schema
+    from day_model import build_day
+    from io import BytesIO
+    schema = load_schema(SCHEMA_PATH)
+    styles = gp.get_styles()
+    builders = [
+        ("iter_page_1_horoscope", gp.iter_page_1_horoscope),
+        ("iter_page_2_rituals", gp.iter_page_2_rituals),
+        ("iter_page_3_chores_kitchen", gp.iter_page_3_chores_kitchen),
+        ("iter_page_4_evening", gp.iter_page_4_evening),
+    ]
+    for size in sizes:
+        data = make_document(size)
+        text = make_checkin_text(data)
+        yield f"parse_text/{size}", (lambda text=text: parse_text(text)), False
+        yield f"validate_json/{size}", (lambda data=data: validate_json(data, schema)), False
+        yield f"build_day/{size}", (lambda data=data: build_day(data, schema)[0]), False
+        day = gp.as_day(data)
+        for name, builder in builders:
+            yield f"{name}/{size}", (lambda day=day, builder=builder: list(builder(day, styles))), False
+
+        def build(day=day):
+            # Story assembly is timed by the page builders; this is layout + PDF write.
+            buffer = BytesIO()
+            doc = gp.make_doc(buffer, day)
+            story = gp.build_story(day)
+            t0 = time.perf_counter()
+            doc.build(story)
+            return time.perf_counter() - t0, len(buffer.getvalue())
+        yield f"doc.build/{size}", build, False
+        if include_cli:
+            yield f"cli/{size}", data, True
+
+
+def run_suite(sizes, min_time, include_cli=True, only=None, cli_runs=3):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='planner-bench-') as tmp:
+        for name, fn, is_cli in collect_benchmarks(sizes, include_cli):
+            if only and not any(pattern in name for pattern in only):
+                continue
+            if is_cli:
+                input_path = os.path.join(tmp, 'day.json')
+                with open(input_path, 'w', encoding='utf-8') as f:
+                    json.dump(fn, f, ensure_ascii=False)
+                runner = _cli_runner(input_path, os.path.join(tmp, 'day.pdf'))
+                stats = run_benchmark(runner, min_time=0, min_runs=cli_runs, measure_memory=False)
+                stats["peak_rss_kb"] = runner.peak_rss_kb
+            else:
+                stats = run_benchmark(fn, min_time)
+            results[name] = stats
+            print(f"{name:42} {stats['ops_per_sec']:10.1f} ops/s  p50 {stats['p50_ms']:9.2f} ms  "
+                  f"p99 {stats['p99_ms']:9.2f} ms  ({stats['runs']} runs)", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, max_regression, min_delta_ms=0.0):
+    """Return [(name, baseline p50, current p50, change)] for benchmarks over max_regression and min_delta_ms."""
+    regressions = []
+    for name, stats in sorted(results.items()):
+        base = baseline.get(name)
+        if not base or not base.get("p50_ms"):
+            continue
+        change = stats["p50_ms"] / base["p50_ms"] - 1.0
+        if change > max_regression and stats["p50_ms"] - base["p50_ms"] >= min_delta_ms:
+            regressions.append((name, base["p50_ms"], stats["p50_ms"], change))
+    return regressions
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Benchmark the Astro Planner parse/validate/render pipeline")
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES), help='Synthetic document sizes to run (default: all)')
+    parser.add_argument('--only', nargs='+', help='Only run benchmarks whose name contains one of these strings')
+    parser.add_argument('--min-time', type=float, default=1.0, help='Seconds to spend per in-process benchmark (default: 1.0)')
+    parser.add_argument('--cli-runs', type=int, default=3, help='Timed runs of the end-to-end CLI per size (default: 3)')
+    parser.add_argument('--no-cli', action='store_true', help='Skip the end-to-end CLI benchmarks')
+    parser.add_argument('--no-startup', action='store_true', help='Skip the startup/* benchmarks')
+    parser.add_argument('--startup-runs', type=int, default=5, help='Timed runs of each startup command (default: 5)')
+    parser.add_argument('--startup-budget-ms', type=float, help='Fail if any startup/* p50 exceeds this many ms')
+    parser.add_argument('--output', help='Write results JSON to this file (default: stdout)')
+    parser.add_argument('--baseline', help='Results JSON from an earlier run to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.25, help='Allowed p50 slowdown vs --baseline as a fraction (default: 0.25)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05,
+                        help='Ignore p50 slowdowns smaller than this many ms vs --baseline (default: 0.05)')
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    import reportlab
+    results = run_suite(args.sizes, args.min_time, not args.no_cli, args.only, args.cli_runs)
+    if not args.no_startup:
+        results.update(run_startup(args.startup_runs, args.only))
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "reportlab": reportlab.Version,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    else:
+        print(json.dumps(report, indent=2))
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)["results"]
+        except Exception as e:
+            print(f"[ERROR] Failed to read baseline: {e}")
+            sys.exit(1)
+        regressions = compare(results, baseline, args.max_regression, args.min_delta_ms)
+        if regressions:
+            print(f"[ERROR] {len(regressions)} benchmark(s) regressed by more than {args.max_regression:.0%} "
+                  f"and {args.min_delta_ms:g} ms:", file=sys.stderr)
+            for name, base_ms, current_ms, change in regressions:
+                print(f"- {name}: p50 {base_ms:.2f} ms -> {current_ms:.2f} ms (+{change:.0%})", file=sys.stderr)
+            sys.exit(1)
+        print(f"No regressions over {args.max_regression:.0%} against {args.baseline}.", file=sys.stderr)
+    if args.startup_budget_ms is not None:
+        over = [(name, stats["p50_ms"]) for name, stats in sorted(results.items())
+                if name.startswith("startup/") and stats["p50_ms"] > args.startup_budget_ms]
+        if over:
+            print(f"[ERROR] {len(over)} entry point(s) over the {args.startup_budget_ms:g} ms startup budget:", file=sys.stderr)
+            for name, p50_ms in over:
+                print(f"- {name}: p50 {p50_ms:.2f} ms", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
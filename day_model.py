@@ -0,0 +1,277 @@
+"""
+Typed day documents: compact __slots__ classes generated from the planner
+schema, built in the same pass that checks a document against it.
+
+Every object in the schema becomes a class whose slots are its properties
+(the root is Day, "focus_of_day" becomes FocusOfDay, the items of
+"upcoming_events" UpcomingEvent) and arrays become tuples. Fields a document
+leaves out read as "" (strings), () (arrays) or an empty instance (objects),
+and an instance is false when its JSON object was empty or absent, so the
+renderers need no .get() chains or isinstance guards. Values every page
+needs are derived once at build time: the header date and weekday, the moon
+phase name and emoji, and the ritual timing windows.
+
+Properties the schema does not name are not kept, so as_dict() returns
+only the named ones. The planner schema forbids any others
+(additionalProperties: false), which makes as_dict() of a validated day
+equal to its source JSON; for other documents it is the schema's view of
+them.
+"""
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+from collections import OrderedDict
+from validate_json import read_schema, check_json, compile_check, recall_by_id, remember_by_id
+
+DAY_NAMES = {
+    'Mon': 'Monday',
+    'Tue': 'Tuesday',
+    'Wed': 'Wednesday',
+    'Thu': 'Thursday',
+    'Fri': 'Friday',
+    'Sat': 'Saturday',
+    'Sun': 'Sunday'
+}
+_DAY_OF_WEEK_RE = re.compile(r"\((\w+)\)")
+_PAREN_SUFFIX_RE = re.compile(r"\s*\(.*\)$")
+_ISO_DATE_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+_MONTH_DAY_RE = re.compile(r"([A-Za-z]+)\s*(\d{1,2}),\s*(\d{4})")
+
+@lru_cache(maxsize=1024)
+def format_header_date(date_str):
+    """Return (formatted date, full weekday name) for the header from a raw 'date' value."""
+    # Extract day of week from parenthesis if present
+    day_of_week = ''
+    m_day = _DAY_OF_WEEK_RE.search(date_str)
+    if m_day:
+        day_of_week = m_day.group(1)
+    # Remove any parenthetical day from the date string
+    date_clean = _PAREN_SUFFIX_RE.sub("", date_str).strip()
+    date_fmt = date_clean
+    # Try to parse YYYY-MM-DD from anywhere in the string
+    m = _ISO_DATE_RE.search(date_clean)
+    if m:
+        try:
+            dt = datetime.strptime(m.group(0), "%Y-%m-%d")
+            date_fmt = dt.strftime("%B %d, %Y")
+        except Exception:
+            date_fmt = date_clean
+    else:
+        # Try to match 'Month DD, YYYY' or fallback
+        m2 = _MONTH_DAY_RE.match(date_clean)
+        if m2:
+            date_fmt = f"{m2.group(1)} {int(m2.group(2))}, {m2.group(3)}"
+    return date_fmt, DAY_NAMES.get(day_of_week, day_of_week)
+
+# Moon phase emoji helpers
+def get_moon_emoji(phase):
+    mapping = {
+        "new moon": "\U0001F311",
+        "waxing crescent": "\U0001F312",
+        "first quarter": "\U0001F313",
+        "waxing gibbous": "\U0001F314",
+        "full moon": "\U0001F315",
+        "waning gibbous": "\U0001F316",
+        "last quarter": "\U0001F317",
+        "waning crescent": "\U0001F318"
+    }
+    phase_lc = (phase or "").strip().lower()
+    return mapping.get(phase_lc, "\U0001F315")
+
+
+class Model:
+    """Base of the generated classes; _given has bit i set when _fields[i] was in the document."""
+    __slots__ = ('_given',)
+    _fields = ()
+
+    def __bool__(self):
+        return self._given != 0
+
+    def __repr__(self):
+        shown = ", ".join(f"{name}={getattr(self, name)!r}" for i, name in enumerate(self._fields) if self._given >> i & 1)
+        return f"{type(self).__name__}({shown})"
+
+    def has(self, name):
+        return bool(self._given >> self._fields.index(name) & 1)
+
+    def field_json(self, name):
+        """The named field as plain JSON data, or None when the document left it out."""
+        return _plain(getattr(self, name)) if self.has(name) else None
+
+    def as_dict(self):
+        return {name: _plain(getattr(self, name)) for i, name in enumerate(self._fields) if self._given >> i & 1}
+
+def _plain(value):
+    if isinstance(value, Model):
+        return value.as_dict()
+    if isinstance(value, tuple):
+        return [_plain(item) for item in value]
+    return value
+
+class _Invalid(Exception):
+    pass
+
+# Values computed once per instance, for classes whose properties include
+# the given ones: (required properties, extra slots, function filling them).
+def _derive_day(day):
+    day.date_text, day.weekday = format_header_date(day.date)
+    phase = day.moon_phase_sign
+    day.moon_phase = phase.split(' in ')[0] if ' in ' in phase else phase
+    day.moon_emoji = get_moon_emoji(day.moon_phase)
+
+def _derive_window(timing):
+    timing.window = f"{timing.window_start}–{timing.window_end}"
+
+_DERIVED = (
+    (('date', 'moon_phase_sign'), ('date_text', 'weekday', 'moon_phase', 'moon_emoji'), _derive_day),
+    (('window_start', 'window_end'), ('window',), _derive_window),
+)
+
+# Schema keywords the builder enforces itself; with others anywhere in the
+# schema, documents are checked with check_json before they are built.
+_BUILD_KEYWORDS = {'type', 'required', 'properties', 'additionalProperties', 'items', 'title', 'description', '$schema', '$id'}
+
+def _class_name(name):
+    return "".join(part.capitalize() for part in name.split("_")) or "Item"
+
+def _compile(schema, name, exact):
+    """Return a build(value, strict) function for schema; exact[0] is cleared for keywords it cannot enforce."""
+    if not isinstance(schema, dict) or not set(schema) <= _BUILD_KEYWORDS:
+        exact[0] = False
+    schema = schema if isinstance(schema, dict) else {}
+    kind = schema.get('type')
+    if kind == 'object' and 'properties' in schema:
+        return _compile_object(schema, name, exact)
+    if kind == 'array' and isinstance(schema.get('items'), dict):
+        item_name = name[:-1] if name.endswith('s') else f"{name}_item"
+        build_item = _compile(schema['items'], item_name, exact)
+
+        def build_array(value, strict):
+            if not isinstance(value, list):
+                if strict:
+                    raise _Invalid
+                return value
+            return tuple(build_item(item, strict) for item in value)
+        return build_array
+    check = compile_check(schema)
+    if check is None:
+        exact[0] = False
+
+    def build_value(value, strict):
+        if strict and check is not None and not check(value):
+            raise _Invalid
+        return value
+    return build_value
+
+def _compile_object(schema, name, exact):
+    fields = tuple(schema['properties'])
+    builders = tuple(_compile(sub, key, exact) for key, sub in schema['properties'].items())
+    required = tuple(schema.get('required', ()))
+    additional = schema.get('additionalProperties', True)
+    additional_check = None if additional in (True, False) else compile_check(additional)
+    if additional_check is None and additional not in (True, False):
+        exact[0] = False
+    derived, derive = (), []
+    for needs, slots, fill in _DERIVED:
+        if set(needs) <= set(fields):
+            derived += slots
+            derive.append(fill)
+    cls = type(_class_name(name), (Model,), {'__slots__': fields + derived, '_fields': fields, '__module__': __name__})
+    positions = {field: i for i, field in enumerate(fields)}
+    empty = cls.__new__(cls)
+
+    def build_object(value, strict):
+        if not isinstance(value, dict):
+            if strict:
+                raise _Invalid
+            return empty
+        if strict:
+            for key in required:
+                if key not in value:
+                    raise _Invalid
+        obj = cls.__new__(cls)
+        given = 0
+        for key, item in value.items():
+            i = positions.get(key)
+            if i is None:
+                if strict and (additional is False or (additional_check is not None and not additional_check(item))):
+                    raise _Invalid
+                continue
+            setattr(obj, key, builders[i](item, strict))
+            given |= 1 << i
+        for i, field in enumerate(fields):
+            if not given >> i & 1:
+                setattr(obj, field, defaults[i])
+        obj._given = given
+        for fill in derive:
+            fill(obj)
+        return obj
+
+    # Defaults for absent fields; nested classes' empty instances exist once the builders do.
+    defaults = tuple(_default(sub, builder) for sub, builder in zip(schema['properties'].values(), builders))
+    for i, field in enumerate(fields):
+        setattr(empty, field, defaults[i])
+    empty._given = 0
+    for fill in derive:
+        fill(empty)
+    build_object.cls = cls
+    return build_object
+
+def _default(schema, builder):
+    kind = schema.get('type') if isinstance(schema, dict) else None
+    if kind == 'string':
+        return ""
+    if kind == 'array':
+        return ()
+    if hasattr(builder, 'cls'):
+        return builder(None, False)
+    return None
+
+# Compiled builders, keyed by schema like validate_json's validators (with
+# the same small identity LRU in front).
+_BUILDERS = {}
+_BUILDERS_BY_ID = OrderedDict()
+
+def _builder(schema):
+    """Return (build, exact) for a schema dict or schema file path."""
+    if isinstance(schema, (str, os.PathLike)):
+        schema = read_schema(schema)
+    cached = recall_by_id(_BUILDERS_BY_ID, schema)
+    if cached is not None:
+        return cached
+    key = hashlib.sha256(json.dumps(schema, sort_keys=True).encode('utf-8')).hexdigest()
+    entry = _BUILDERS.get(key)
+    if entry is None:
+        exact = [True]
+        build = _compile(schema, "day", exact)
+        entry = _BUILDERS[key] = (build, exact[0])
+    remember_by_id(_BUILDERS_BY_ID, schema, entry)
+    return entry
+
+def day_class(schema):
+    """The generated class of whole day documents (Day for the planner schema)."""
+    return _builder(schema)[0].cls
+
+def build_day(data, schema):
+    """Check data against schema and build its Day in one pass.
+
+    Returns (day, []) for a valid document and (None, ValidationIssue list)
+    otherwise; the issues are collected by check_json only on failure.
+    """
+    build, exact = _builder(schema)
+    if exact:
+        try:
+            return build(data, True), []
+        except _Invalid:
+            pass
+    errors = check_json(data, schema)
+    return (None, errors) if errors else (build(data, False), [])
+
+def to_day(data, schema):
+    """The Day for data without checking it (a Day is returned as is)."""
+    if isinstance(data, Model):
+        return data
+    return _builder(schema)[0](data, False)
@@ -0,0 +1,147 @@
+"""
+Persistent cache of parsed TrueType faces for the planner PDF generator.
+
+Parsing the DejaVu/Symbola TTFs dominates cold start of short-lived CLI and
+worker processes. The parsed metrics and glyph tables of each face are
+pickled under a cache directory, keyed by the SHA-256 of the font file, so
+later processes only hash the file and unpickle its tables.
+
+Faces also keep the last few font subsets they built: a document rendered
+with a page_cache.FontBook asks for the same subsets as the one before it.
+"""
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from fnmatch import fnmatch
+from weakref import WeakKeyDictionary
+from reportlab import rl_config
+from reportlab.pdfbase.ttfonts import TTEncoding, TTFont, TTFontFace
+
+# Bump when the pickled layout (or the reportlab face attributes) change.
+CACHE_VERSION = 1
+# PLANNER_FONT_CACHE overrides the location; "off" disables the on-disk cache.
+DEFAULT_CACHE_DIR = os.environ.get('PLANNER_FONT_CACHE') or os.path.join(
+    os.path.expanduser('~'), '.cache', 'astro_planner', 'fonts')
+if DEFAULT_CACHE_DIR == 'off':
+    DEFAULT_CACHE_DIR = None
+
+# Subsets (TrueType font programs) each face keeps, most recently used last.
+SUBSET_CACHE_SIZE = 16
+
+# Faces already loaded in this process, by file hash (two names may share a file).
+_faces = {}
+# (glyphs drawn, glyphs embedded) per font in the most recent render.
+_glyph_usage = {}
+
+
+def _scale_for(units_per_em):
+    # Mirrors TTFontFile.extractInfo, whose lambda cannot be pickled.
+    if units_per_em == 1000:
+        return lambda x: x
+    mult = 1000 / units_per_em
+    return lambda x: x * mult
+
+
+class CachedTTFontFace(TTFontFace):
+    """TTFontFace that reuses the font programs of recently built subsets."""
+
+    def makeSubset(self, subset):
+        subsets = self.__dict__.setdefault('_subsets', OrderedDict())
+        key = tuple(subset)
+        data = subsets.get(key)
+        if data is None:
+            data = subsets[key] = super().makeSubset(subset)
+            if len(subsets) > SUBSET_CACHE_SIZE:
+                subsets.popitem(last=False)
+        else:
+            subsets.move_to_end(key)
+        return data
+
+
+def load_face(filename, cache_dir=DEFAULT_CACHE_DIR):
+    """Return a TTFontFace for filename, from the cache when the file hash matches."""
+    with open(filename, 'rb') as f:
+        ttf_data = f.read()
+    digest = hashlib.sha256(ttf_data).hexdigest()
+    if digest in _faces:
+        return _faces[digest]
+    _faces[digest] = face = _load_face(filename, ttf_data, digest, cache_dir)
+    return face
+
+
+def _load_face(filename, ttf_data, digest, cache_dir):
+    cache_path = os.path.join(cache_dir, f"{digest}.v{CACHE_VERSION}.pickle") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                state = pickle.load(f)
+            face = CachedTTFontFace.__new__(CachedTTFontFace)
+            face.__dict__.update(state)
+            face._ttf_data = ttf_data
+            face._pdfScale = _scale_for(face.unitsPerEm)
+            face.filename = filename
+            return face
+        except Exception:
+            pass  # corrupt or incompatible entry: fall through and re-parse
+    face = CachedTTFontFace(filename)
+    if cache_path:
+        state = dict(face.__dict__)
+        state.pop('_ttf_data', None)
+        state.pop('_pdfScale', None)
+        state.pop('_subsets', None)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # read-only or full cache dir: still render, just uncached
+    return face
+
+
+class CachedTTFont(TTFont):
+    """TTFont whose face comes from load_face and which records glyph usage per render."""
+
+    def __init__(self, name, filename, cache_dir=DEFAULT_CACHE_DIR):
+        if cache_dir is None:
+            super().__init__(name, filename)
+            return
+        # Same attributes TTFont.__init__ sets, minus the TTF parse.
+        self.fontName = name
+        self.face = load_face(filename, cache_dir)
+        self.encoding = TTEncoding()
+        self.state = WeakKeyDictionary()
+        self._asciiReadable = rl_config.ttfAsciiReadable
+        unshaped = getattr(rl_config, 'unShapedFontGlob', ())
+        self.shapable = not any(fnmatch(name, pattern) for pattern in unshaped)
+
+    def splitString(self, text, doc, encoding='utf-8'):
+        used = self.__dict__.setdefault('_used', WeakKeyDictionary())
+        chars = used.get(doc)
+        if chars is None:
+            chars = used[doc] = set()
+        chars.update(text.decode(encoding) if isinstance(text, bytes) else text)
+        return super().splitString(text, doc, encoding)
+
+    def addObjects(self, doc):
+        # The subset state is discarded by TTFont.addObjects, so record it first.
+        state = self.state.get(doc)
+        if state is not None:
+            chars = self.__dict__.get('_used', {}).get(doc, ())
+            _glyph_usage[self.fontName] = (len(chars), len(state.assignments))
+        super().addObjects(doc)
+
+
+def reset_glyph_usage():
+    _glyph_usage.clear()
+
+
+def glyph_usage():
+    """Return {font name: (glyphs drawn, glyphs embedded)} since the last reset.
+
+    Embedded counts include the ASCII range reportlab always puts in the first
+    subset (rl_config.ttfAsciiReadable).
+    """
+    return dict(_glyph_usage)
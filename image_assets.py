@@ -0,0 +1,49 @@
+"""
+Pre-processed raster assets for the planner templates.
+
+Template images are drawn far smaller than their source files (the 1024px
+crystal ball fills a 36pt slot). Each image is decoded once per process,
+resampled to the pixel size it is drawn at for the target DPI and kept as a
+reportlab ImageReader with its RGB data and alpha mask already split out, so
+each document embeds a small image instead of re-encoding the full-resolution
+source.
+"""
+import math
+import os
+from functools import lru_cache
+from reportlab.lib.utils import ImageReader
+
+DEFAULT_DPI = 300
+
+
+def target_pixels(points, dpi):
+    return max(1, math.ceil(points / 72.0 * dpi))
+
+
+@lru_cache(maxsize=None)
+def _prepared(path, mtime_ns, size, width_px, height_px):
+    from PIL import Image
+    with Image.open(path) as im:
+        im.load()
+        if im.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            im = im.convert('RGBA' if 'transparency' in im.info else 'RGB')
+        if width_px < im.width or height_px < im.height:
+            # Pillow resamples RGBA with premultiplied alpha, so edges keep their colour.
+            im = im.resize((min(width_px, im.width), min(height_px, im.height)), Image.LANCZOS)
+    reader = ImageReader(im)
+    reader.getRGBData()  # splits off the alpha mask; cached on the reader
+    return reader
+
+
+def prepared_image(path, width_pt, height_pt, dpi=DEFAULT_DPI):
+    """Return a shared ImageReader for path sized for a width_pt x height_pt slot at dpi.
+
+    Returns None when the file does not exist. The file's mtime and size are
+    part of the cache key, so an edited asset is picked up by the next call.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return _prepared(os.path.abspath(path), st.st_mtime_ns, st.st_size,
+                     target_pixels(width_pt, dpi), target_pixels(height_pt, dpi))
@@ -0,0 +1,103 @@
+"""
+Output size/speed profiles for the planner PDF writer.
+
+    fast      page and form streams stored uncompressed, fonts deflated at zlib level 1
+    balanced  every stream deflated at zlib's default level (the default)
+    smallest  zlib level 9, the header image resampled for 150 dpi and font
+              subsets without the ASCII block reportlab otherwise reserves
+
+No profile ASCII85-encodes binary streams; reportlab does so by default,
+which adds a quarter to every compressed stream for no benefit in a binary
+PDF file. reportlab always writes plain objects (no PDF 1.5 object streams),
+so object packing is not something a profile can change.
+
+reportlab is imported only when a profile is applied, so the CLI can list
+the profiles without loading it.
+"""
+import zlib
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+# page_compression: deflate page and form content streams.
+# compress_level: zlib level for every deflated stream reportlab writes
+#   through its shared filter (pages, forms, font files, ToUnicode maps).
+# image_dpi: resolution template images are resampled for.
+# ascii_readable: keep codes 32-126 of each font subset for ASCII text.
+OutputProfile = namedtuple('OutputProfile', 'name page_compression compress_level image_dpi ascii_readable')
+
+PROFILES = {
+    'fast': OutputProfile('fast', 0, 1, 300, True),
+    'balanced': OutputProfile('balanced', 1, 6, 300, True),
+    'smallest': OutputProfile('smallest', 1, 9, 150, False),
+}
+DEFAULT_PROFILE = 'balanced'
+
+_active = PROFILES[DEFAULT_PROFILE]
+
+
+def get_profile(profile=None):
+    """Return the OutputProfile for a name (or pass one through); None is the active profile."""
+    if profile is None:
+        return _active
+    if isinstance(profile, OutputProfile):
+        return profile
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"unknown output profile {profile!r} (choose from {', '.join(PROFILES)})") from None
+
+
+# Deflated streams kept per level. Pages replayed from a page cache, the
+# page chrome and font subsets come out byte-identical from one render of a
+# document to the next, so they are compressed once.
+DEFLATE_CACHE_SIZE = 64
+_deflated = {}
+
+
+class _LevelZCompress:
+    # Stands in for pdfdoc.PDFZCompress, reportlab's shared FlateDecode filter.
+    pdfname = "FlateDecode"
+
+    def __init__(self, level):
+        self.level = level
+        self.cache = _deflated.setdefault(level, OrderedDict())
+
+    def encode(self, text):
+        if isinstance(text, str):
+            text = text.encode('utf8')
+        encoded = self.cache.get(text)
+        if encoded is None:
+            encoded = self.cache[text] = zlib.compress(text, self.level)
+            if len(self.cache) > DEFLATE_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(text)
+        return encoded
+
+    def decode(self, encoded):
+        return zlib.decompress(encoded)
+
+
+@contextmanager
+def applied(profile, fonts=()):
+    """Apply profile to reportlab's writer settings and fonts for the duration of a build.
+
+    The settings are process-wide, so renders in the same process must not
+    overlap (the batch workers and the server render one document at a time).
+    """
+    global _active
+    from reportlab import rl_config
+    from reportlab.pdfbase import pdfdoc
+    profile = get_profile(profile)
+    saved = (_active, rl_config.useA85, pdfdoc.PDFZCompress, [font._asciiReadable for font in fonts])
+    _active = profile
+    rl_config.useA85 = 0
+    pdfdoc.PDFZCompress = _LevelZCompress(profile.compress_level)
+    for font in fonts:
+        font._asciiReadable = profile.ascii_readable
+    try:
+        yield profile
+    finally:
+        _active, rl_config.useA85, pdfdoc.PDFZCompress, readable = saved
+        for font, value in zip(fonts, readable):
+            font._asciiReadable = value
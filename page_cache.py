@@ -0,0 +1,121 @@
+"""
+In-memory cache of rendered page content for incremental re-renders.
+
+When a day document is edited and rendered again, only the pages whose
+inputs changed need to be laid out and drawn; the others can reuse the
+content-stream operators drawn last time. reportlab makes that hard in one
+way: it numbers fonts (F1, F2, ...) and assigns each glyph a subset code in
+the order a document first uses them, so drawn text is only valid inside the
+document that drew it. A FontBook removes the ordering: every document
+rendered with the book registers the book's fonts in book order and starts
+each TrueType font's subset state from the book's code assignments, and the
+glyphs a document adds are written back to the book after its build. Codes
+are never reassigned, so cached page content stays valid for as long as the
+book does (its generation is part of every page key).
+
+The price is that each document embeds every glyph the book has seen, not
+just the ones it draws; books are reset (and their pages dropped) once a font
+passes max_codes. Books and cached pages belong to one process and are not
+thread-safe, like the rest of the render path.
+"""
+import hashlib
+import json
+from collections import OrderedDict, namedtuple
+from reportlab.pdfbase import pdfmetrics
+
+DEFAULT_MAX_PAGES = 256
+DEFAULT_MAX_CODES = 1024
+
+# One physical page of cached content: the page template it was laid out on,
+# the operators drawn after the template's onPage callback, the form XObjects
+# those operators use and their definitions ({name: (bbox, operators)}).
+CachedPage = namedtuple('CachedPage', 'template ops forms_used forms')
+
+
+class FontBook:
+    def __init__(self, ascii_readable, max_codes=DEFAULT_MAX_CODES):
+        self.ascii_readable = ascii_readable
+        self.max_codes = max_codes
+        self.generation = 0
+        self.fonts = []    # font names in internal-name order (F1, F2, ...)
+        self.states = {}   # TrueType font name -> (assignments, subsets, next code)
+
+    def seed(self, doc):
+        """Register the book's fonts on a fresh PDFDocument, with the book's glyph codes."""
+        for name in self.fonts:
+            font = pdfmetrics.getFont(name)
+            if not getattr(font, '_dynamicFont', 0):
+                doc.getInternalFontName(name)
+                continue
+            state = font._assignState(doc, self.ascii_readable)
+            saved = self.states.get(name)
+            if saved is not None:
+                assignments, subsets, next_code = saved
+                state.assignments = dict(assignments)
+                state.subsets = [list(subset) for subset in subsets]
+                state.nextCode = next_code
+            font.getSubsetInternalName(0, doc)
+
+    def absorb(self, doc):
+        """Record the fonts and glyph codes doc added; call after layout, before saving.
+
+        Returns False (and starts a new generation) when the book outgrew max_codes.
+        """
+        for name in doc.fontMapping:
+            if name not in self.fonts:
+                self.fonts.append(name)
+        for name in self.fonts:
+            state = getattr(pdfmetrics.getFont(name), 'state', {}).get(doc)
+            if state is None:
+                continue
+            if state.nextCode > self.max_codes:
+                self.reset()
+                return False
+            self.states[name] = (dict(state.assignments), [list(subset) for subset in state.subsets], state.nextCode)
+        return True
+
+    def reset(self):
+        self.generation += 1
+        self.fonts = []
+        self.states = {}
+
+
+class PageCache:
+    def __init__(self, max_pages=DEFAULT_MAX_PAGES, max_codes=DEFAULT_MAX_CODES):
+        self.max_pages = max_pages
+        self.max_codes = max_codes
+        self.books = {}
+        self.groups = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def book(self, profile):
+        """The FontBook for an output profile (subset layout depends on its ascii_readable)."""
+        book = self.books.get(profile.name)
+        if book is None:
+            book = self.books[profile.name] = FontBook(profile.ascii_readable, self.max_codes)
+        return book
+
+    def key(self, page, inputs, book):
+        canonical = json.dumps({"page": page, "inputs": inputs, "generation": book.generation},
+                               sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return f"{id(book)}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+    def get(self, key):
+        """Return the CachedPage list for one page builder's output, or None."""
+        pages = self.groups.get(key)
+        if pages is None:
+            self.misses += 1
+            return None
+        self.groups.move_to_end(key)
+        self.hits += 1
+        return pages
+
+    def put(self, key, pages):
+        self.groups[key] = pages
+        self.groups.move_to_end(key)
+        while len(self.groups) > self.max_pages:
+            self.groups.popitem(last=False)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.groups)}
@@ -0,0 +1,375 @@
+"""
+Low-resolution raster previews of planner pages, painted with Pillow.
+
+A preview is painted from the page's own PDF content stream while the
+document is being built (the doc template calls paint_page as page 1 ends),
+so it needs no second layout and no PDF rasteriser. It reads reportlab
+internals to do so: the page operators in canvas._code, the fonts in
+doc.fontMapping and the images in doc.idToObject.
+
+Only the operators reportlab's canvas writes for the planner are painted
+(PAINTED): the graphics state (q Q cm w, rg RG g G k K colours), paths
+(m l c v y re h; curves are drawn as lines) and their paint operators
+(S s f F f* B B* b b*), text (BT Tm Td T* TL Tf Tc Tw Tj ' TJ) and Do for
+form XObjects and Flate or JPEG image XObjects. IGNORED operators change
+nothing visible at thumbnail size. Any other operator, and any operator
+whose operands cannot be painted, is skipped and reported on stderr once
+per process, so a page that outgrows the painter shows up instead of
+quietly losing content.
+"""
+import re
+import sys
+import zlib
+from functools import lru_cache
+from io import BytesIO
+from PIL import Image, ImageDraw, ImageFont
+from reportlab.pdfbase import pdfdoc, pdfmetrics
+
+SUPERSAMPLE = 3  # painted this many times larger, then reduced: hinted glyphs are too heavy at thumbnail sizes
+FORMATS = {'.png': 'PNG', '.webp': 'WEBP'}
+
+_IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+_TOKEN_RE = re.compile(r"\s*(?:(/[^\s/\[\]()<>]*)|([+-]?(?:\d+\.?\d*|\.\d+))|(\[|\])|(<[0-9A-Fa-f\s]*>)|([^\s/\[\]()<>]+)|(\())")
+_ESCAPES = {'n': 10, 'r': 13, 't': 9, 'b': 8, 'f': 12}
+_IMAGE_MODES = {'DeviceRGB': 'RGB', 'DeviceGray': 'L', 'DeviceCMYK': 'CMYK'}
+_PATH_PAINT = frozenset(('S', 's', 'f', 'F', 'f*', 'B', 'B*', 'b', 'b*'))
+PAINTED = frozenset(('q', 'Q', 'cm', 'w', 'rg', 'RG', 'g', 'G', 'k', 'K', 'm', 'l', 'c', 'v', 'y', 're', 'h',
+                     'BT', 'Tm', 'Td', 'T*', 'TL', 'Tf', 'Tc', 'Tw', 'Tj', "'", 'TJ', 'Do')) | _PATH_PAINT
+IGNORED = frozenset(('n', 'ET', 'd', 'J', 'j', 'M', 'i', 'ri', 'gs', 'W', 'W*', 'Tz', 'Ts', 'Tr',
+                     'BMC', 'BDC', 'EMC', 'MP', 'DP', 'BX', 'EX'))
+_reported = set()
+
+
+def preview_format(path, default='PNG'):
+    """The Pillow format for a preview path (.png or .webp)."""
+    for ext, fmt in FORMATS.items():
+        if str(path).lower().endswith(ext):
+            return fmt
+    return default
+
+
+def save_preview(image, target, fmt='PNG'):
+    """Write a preview to target (a path or binary file object) as PNG or WebP.
+
+    Encoder settings favour speed: on a planner page the slower ones save a
+    few hundred bytes at most.
+    """
+    if fmt == 'WEBP':
+        image.save(target, 'WEBP', quality=70, method=2)
+    else:
+        image.quantize(32).save(target, 'PNG')
+
+
+def _mul(m, n):
+    # The matrix that applies m, then n.
+    a, b, c, d, e, f = m
+    A, B, C, D, E, F = n
+    return (a * A + b * C, a * B + b * D, c * A + d * C, c * B + d * D, e * A + f * C + E, e * B + f * D + F)
+
+
+def _apply(m, x, y):
+    return m[0] * x + m[2] * y + m[4], m[1] * x + m[3] * y + m[5]
+
+
+def _tokens(text):
+    # Yields numbers (float), names ('/F1'), operators (str), strings (bytes), '[' and ']'.
+    pos, end = 0, len(text)
+    while pos < end:
+        match = _TOKEN_RE.match(text, pos)
+        if match is None or match.end() == pos:
+            break
+        pos = match.end()
+        name, number, bracket, hexstr, op, paren = match.groups()
+        if paren:
+            value, pos = _literal(text, pos)
+            yield value
+        elif number is not None:
+            yield float(number)
+        elif hexstr is not None:
+            digits = re.sub(r"\s", "", hexstr[1:-1])
+            yield bytes.fromhex(digits + "0" * (len(digits) % 2))
+        else:
+            yield name or bracket or op
+
+
+def _literal(text, pos):
+    out = bytearray()
+    depth = 1
+    while pos < len(text):
+        ch = text[pos]
+        pos += 1
+        if ch == '\\':
+            nxt = text[pos:pos + 1]
+            pos += 1
+            if nxt.isdigit():
+                digits = nxt
+                while len(digits) < 3 and text[pos:pos + 1].isdigit():
+                    digits += text[pos]
+                    pos += 1
+                out.append(int(digits, 8) & 0xFF)
+            elif nxt in _ESCAPES:
+                out.append(_ESCAPES[nxt])
+            elif nxt not in '\r\n':
+                out.extend(nxt.encode('latin-1', 'replace'))
+            continue
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+            if not depth:
+                break
+        out.extend(ch.encode('latin-1', 'replace'))
+    return bytes(out), pos
+
+
+@lru_cache(maxsize=64)
+def _truetype(path, size_px):
+    return ImageFont.truetype(path, size_px)
+
+
+@lru_cache(maxsize=4096)
+def _glyph(path, size_px, char):
+    # (left, top, coverage mask) of one glyph about its baseline origin, or None
+    # for blanks. Pillow lays out every string from scratch, so pages are drawn
+    # from cached glyphs instead.
+    font = _truetype(path, size_px)
+    left, top, right, bottom = font.getbbox(char, anchor='ls')
+    if right <= left or bottom <= top:
+        return None
+    mask = Image.new('L', (right - left, bottom - top))
+    ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=255, anchor='ls')
+    return left, top, mask
+
+
+@lru_cache(maxsize=4096)
+def _advance(font_name, char):
+    return pdfmetrics.stringWidth(char, font_name, 1000) / 1000.0
+
+
+def _doc_fonts(doc, fallback_font):
+    # {PDF font resource name: (font name, TTF file, codes -> characters or None for Latin-1)}
+    fonts = {}
+    for font_name, internal in doc.fontMapping.items():
+        font = pdfmetrics.getFont(font_name)
+        state = getattr(font, 'state', {}).get(doc) if getattr(font, '_dynamicFont', 0) else None
+        if state is None:
+            fonts[internal[1:]] = (font_name, fallback_font, None)
+            continue
+        for n, subset in enumerate(state.subsets):
+            fonts[f"{internal[1:]}+{n}"] = (font_name, font.face.filename, subset)
+    return fonts
+
+
+def _decode_image(obj, doc):
+    data = obj.streamContent
+    if isinstance(data, str):
+        data = data.encode('latin-1')
+    filters = tuple(obj._filters or ())
+    if filters == ('DCTDecode',):
+        image = Image.open(BytesIO(data))
+        image.load()
+    elif filters in (('FlateDecode',), ()) and obj.colorSpace in _IMAGE_MODES and obj.bitsPerComponent == 8:
+        raw = zlib.decompress(data) if filters else data
+        image = Image.frombytes(_IMAGE_MODES[obj.colorSpace], (obj.width, obj.height), raw)
+    else:
+        return None, None
+    mask = None
+    smask = getattr(obj, 'smask', None)
+    if smask is not None:
+        mask_obj = doc.idToObject.get(getattr(smask, 'name', None))
+        if isinstance(mask_obj, pdfdoc.PDFImageXObject):
+            mask, _ = _decode_image(mask_obj, doc)
+            if mask is not None:
+                mask = mask.convert('L')
+    return image.convert('RGB'), mask
+
+
+class _Painter:
+    def __init__(self, doc, forms, fallback_font, scale, height):
+        self.doc = doc
+        self.forms = forms
+        self.fonts = _doc_fonts(doc, fallback_font)
+        self.scale = scale
+        self.height = height
+        self.image = None
+        self.draw = None
+        self.skipped = set()
+
+    def device(self, m, x, y):
+        x, y = _apply(m, x, y)
+        return x * self.scale, self.height - y * self.scale
+
+    def run(self, ops, ctm):
+        gs = {'ctm': ctm, 'fill': (0, 0, 0), 'stroke': (0, 0, 0), 'lw': 1.0}
+        stack = []
+        text = {'tm': _IDENTITY, 'tlm': _IDENTITY, 'font': None, 'size': 0.0, 'leading': 0.0, 'tc': 0.0, 'tw': 0.0}
+        path, subpath = [], []
+        operands = []
+        array = None
+        for tok in _tokens(ops):
+            if tok == '[':
+                array = []
+                continue
+            if tok == ']':
+                operands.append(array or [])
+                array = None
+                continue
+            if array is not None:
+                array.append(tok)
+                continue
+            if not isinstance(tok, str) or tok.startswith('/'):
+                operands.append(tok)
+                continue
+            args, operands = operands, []
+            if tok not in PAINTED:
+                if tok not in IGNORED:
+                    self.skipped.add(tok)
+            else:
+                try:
+                    self.op(tok, args, gs, stack, text, path, subpath)
+                except (IndexError, TypeError, ValueError, KeyError, OSError):
+                    self.skipped.add(tok)  # malformed operands; a preview never fails the render
+            if tok in _PATH_PAINT or tok == 'n':
+                path.clear()
+                subpath.clear()
+
+    def op(self, op, args, gs, stack, text, path, subpath):
+        if op == 'q':
+            stack.append(dict(gs))
+        elif op == 'Q':
+            if stack:
+                gs.update(stack.pop())
+        elif op == 'cm':
+            gs['ctm'] = _mul(tuple(args[:6]), gs['ctm'])
+        elif op == 'w':
+            gs['lw'] = args[0]
+        elif op in ('rg', 'RG', 'g', 'G', 'k', 'K'):
+            if op in ('g', 'G'):
+                rgb = (args[0],) * 3
+            elif op in ('k', 'K'):
+                c, m, y, k = args[:4]
+                rgb = ((1 - c) * (1 - k), (1 - m) * (1 - k), (1 - y) * (1 - k))
+            else:
+                r, g, b = args
+                rgb = (r, g, b)
+            gs['fill' if op.islower() else 'stroke'] = tuple(int(round(v * 255)) for v in rgb)
+        elif op == 'm':
+            if subpath:
+                path.append(subpath[:])
+            subpath[:] = [self.device(gs['ctm'], args[0], args[1])]
+        elif op in ('l', 'c', 'v', 'y'):
+            subpath.append(self.device(gs['ctm'], args[-2], args[-1]))
+        elif op == 're':
+            x, y, w, h = args[:4]
+            if subpath:
+                path.append(subpath[:])
+                subpath.clear()
+            m = gs['ctm']
+            path.append([self.device(m, x, y), self.device(m, x + w, y), self.device(m, x + w, y + h),
+                         self.device(m, x, y + h), self.device(m, x, y)])
+        elif op == 'h':
+            if subpath:
+                subpath.append(subpath[0])
+        elif op in _PATH_PAINT:
+            shapes = path + ([subpath] if subpath else [])
+            fill = op not in ('S', 's')
+            stroke = op in ('S', 's', 'B', 'B*', 'b', 'b*')
+            width = max(1, int(round(gs['lw'] * self.scale * abs(gs['ctm'][3]))))
+            for points in shapes:
+                if fill and len(points) > 2:
+                    self.draw.polygon(points, fill=gs['fill'])
+                if stroke and len(points) > 1:
+                    self.draw.line(points, fill=gs['stroke'], width=width)
+        elif op == 'BT':
+            text['tm'] = text['tlm'] = _IDENTITY
+        elif op == 'Tm':
+            text['tm'] = text['tlm'] = tuple(args[:6])
+        elif op == 'Td':
+            text['tm'] = text['tlm'] = _mul((1, 0, 0, 1, args[0], args[1]), text['tlm'])
+        elif op == 'TL':
+            text['leading'] = args[0]
+        elif op == 'T*':
+            text['tm'] = text['tlm'] = _mul((1, 0, 0, 1, 0, -text['leading']), text['tlm'])
+        elif op == 'Tf':
+            text['font'], text['size'] = args[0][1:], args[1]
+        elif op == 'Tc':
+            text['tc'] = args[0]
+        elif op == 'Tw':
+            text['tw'] = args[0]
+        elif op == 'Tj':
+            self.show(args[0], gs, text)
+        elif op == "'":
+            self.op('T*', [], gs, stack, text, path, subpath)
+            self.show(args[0], gs, text)
+        elif op == 'TJ':
+            for item in args[0]:
+                if isinstance(item, bytes):
+                    self.show(item, gs, text)
+                else:
+                    text['tm'] = _mul((1, 0, 0, 1, -item / 1000.0 * text['size'], 0), text['tm'])
+        elif op == 'Do':
+            self.do(args[0][1:], gs)
+
+    def show(self, codes, gs, text):
+        font_name, font_file, subset = self.fonts[text['font']]
+        if subset is None:
+            chars = codes.decode('latin-1')
+        else:
+            chars = ''.join(chr(subset[c]) if c < len(subset) else ' ' for c in codes)
+        size = text['size']
+        m = _mul(text['tm'], gs['ctm'])
+        px = round(size * self.scale * (m[1] ** 2 + m[3] ** 2) ** 0.5 * 4) / 4.0
+        advance = 0.0
+        for code, char in zip(codes, chars):
+            glyph = _glyph(font_file, px, char) if px >= 1 else None
+            if glyph is not None:
+                x, y = self.device(m, advance, 0)
+                left, top, mask = glyph
+                self.image.paste(gs['fill'], (int(round(x)) + left, int(round(y)) + top), mask)
+            advance += _advance(font_name, char) * size + text['tc'] + (text['tw'] if code == 32 else 0)
+        text['tm'] = _mul((1, 0, 0, 1, advance, 0), text['tm'])
+
+    def do(self, name, gs):
+        ops = self.forms.get(name)
+        if ops is not None:
+            self.run('\n'.join(ops), gs['ctm'])
+            return
+        obj = self.doc.idToObject.get(name)
+        if not isinstance(obj, pdfdoc.PDFImageXObject):
+            self.skipped.add('Do')
+            return
+        image, mask = _decode_image(obj, self.doc)
+        if image is None:
+            self.skipped.add('Do')
+            return
+        x0, y0 = self.device(gs['ctm'], 0, 1)
+        x1, y1 = self.device(gs['ctm'], 1, 0)
+        box = (int(round(min(x0, x1))), int(round(min(y0, y1))), int(round(max(x0, x1))), int(round(max(y0, y1))))
+        size = (max(1, box[2] - box[0]), max(1, box[3] - box[1]))
+        image = image.resize(size, Image.LANCZOS)
+        if mask is not None:
+            mask = mask.resize(size, Image.LANCZOS)
+        self.image.paste(image, box[:2], mask)
+
+
+def paint_page(canvas, width, forms=None, fallback_font=None):
+    """Paint the page canvas is drawing, as it stands, into an RGB image width pixels wide.
+
+    Call before the page is shown (the operators are read from canvas._code).
+    forms maps form names to (bbox, operators) as draw_chrome records them;
+    fallback_font is the TTF file drawn for the standard PDF fonts.
+    """
+    page_w, page_h = canvas._pagesize
+    scale = width * SUPERSAMPLE / float(page_w)
+    height = int(round(page_h * scale))
+    doc = canvas._doc
+    painter = _Painter(doc, {doc.getXObjectName(name): ops for name, (_, ops) in (forms or {}).items()},
+                       fallback_font, scale, height)
+    painter.image = Image.new('RGB', (width * SUPERSAMPLE, height), 'white')
+    painter.draw = ImageDraw.Draw(painter.image)
+    painter.run('\n'.join(canvas._code), _IDENTITY)
+    new = painter.skipped - _reported
+    if new:
+        _reported.update(new)
+        print(f"[WARN] preview: skipped PDF operators it cannot paint: {' '.join(sorted(new))}", file=sys.stderr)
+    return painter.image.reduce(SUPERSAMPLE)
@@ -0,0 +1,437 @@
+"""
+Packed archive of rendered planners: append-only segment files plus a
+compact index, instead of one loose PDF per day.
+
+An archive is a directory of numbered segments (seg-000001.pak, ...). Each
+segment is a run of self-describing records (key, optional source JSON, PDF,
+CRC-32) and has an index file beside it (seg-000001.idx) listing each
+record's key and offsets. Keys are "<user>/<YYYY-MM-DD>", and batch renders
+add the record name ("<user>/<YYYY-MM-DD>/<name>") so that days of many
+subscribers, or a batch run with --date, stay apart. A key written again
+supersedes the earlier record and remove() appends a tombstone; the space
+they leave behind is reclaimed by compact(), which copies the live records
+of wasteful segments into new ones and deletes the old files.
+
+Reads map the segments into memory, so pdf()/source() return memoryviews
+without copying. An archive has one writer at a time; readers in other
+processes see records once the writer has flushed (after every batch and
+on close). A segment or index cut short by a crash is repaired on open: the
+index is rebuilt from the segment's records and a torn last record is
+dropped.
+
+    python planner_archive.py list ARCHIVE [PATTERN ...]
+    python planner_archive.py extract ARCHIVE PATTERN ... [--out-dir DIR] [--source]
+    python planner_archive.py compact ARCHIVE [--min-dead FRACTION]
+"""
+import argparse
+import fnmatch
+import glob
+import mmap
+import os
+import struct
+import sys
+import zlib
+from collections import namedtuple
+from datetime import datetime
+from render_cache import content_hash
+
+DEFAULT_SEGMENT_BYTES = 256 * 1024 * 1024
+DEFAULT_USER = "default"
+
+_SEGMENT_MAGIC = b"PLNRSEG1"
+_INDEX_MAGIC = b"PLNRIDX1"
+# Record header: magic, flags, key length, source length, PDF length, CRC-32
+# of key + source + PDF. The key, source and PDF follow in that order.
+_RECORD = struct.Struct("<4sBHIII")
+_RECORD_MAGIC = b"PREC"
+# Index entry: flags, key length, record offset, source length, PDF length; the key follows.
+_INDEX = struct.Struct("<BHQII")
+_TOMBSTONE = 1
+
+# Where a live planner is stored; offset is the record's start in the segment.
+ArchiveEntry = namedtuple("ArchiveEntry", "key segment offset source_len pdf_len")
+
+
+def day_stamp(data, date_override=None):
+    """YYYY-MM-DD of a day document, or a content hash prefix when it has no usable date."""
+    date_str = date_override if date_override else data.get("date", "")
+    try:
+        # Dates may carry a weekday suffix: "2025-09-03 (Wed)".
+        return datetime.strptime(str(date_str)[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        # No usable date: name the planner after its content, not the day it was rendered.
+        return content_hash(data)[:12]
+
+
+def archive_key(user, data, date_override=None, name=None):
+    key = f"{user or DEFAULT_USER}/{day_stamp(data, date_override)}"
+    return f"{key}/{name}" if name else key
+
+
+def _record_size(entry):
+    return _RECORD.size + len(entry.key.encode("utf-8")) + entry.source_len + entry.pdf_len
+
+
+class PlannerArchive:
+    def __init__(self, path, segment_bytes=DEFAULT_SEGMENT_BYTES, readonly=False):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.readonly = readonly
+        self._index = {}      # key -> ArchiveEntry of its live record
+        self._segments = {}   # segment number -> [file bytes, live record bytes]
+        self._maps = {}       # segment number -> (mmap, mapped length)
+        self._writer = None   # (segment number, segment file, index file) being appended to
+        self._sealed = ()     # segments compact() is rewriting; never appended to
+        if not readonly:
+            os.makedirs(path, exist_ok=True)
+        for number in self._segment_numbers():
+            self._load_segment(number)
+
+    # -- layout ---------------------------------------------------------------
+
+    def _segment_path(self, number, ext="pak"):
+        return os.path.join(self.path, f"seg-{number:06d}.{ext}")
+
+    def _segment_numbers(self):
+        numbers = []
+        for path in glob.glob(os.path.join(self.path, "seg-*.pak")):
+            try:
+                numbers.append(int(os.path.basename(path)[4:-4]))
+            except ValueError:
+                continue
+        return sorted(numbers)
+
+    def _load_segment(self, number):
+        seg_path = self._segment_path(number)
+        with open(seg_path, "rb") as f:
+            if f.read(len(_SEGMENT_MAGIC)) != _SEGMENT_MAGIC:
+                raise ValueError(f"{seg_path} is not a planner archive segment")
+        size = os.path.getsize(seg_path)
+        entries, end = self._read_index(number, size)
+        if end < size:
+            # Records the index missed (a crash between the two writes, or no index at all).
+            recovered, end = self._scan(seg_path, end)
+            entries.extend(recovered)
+            if end < size and not self.readonly:
+                with open(seg_path, "r+b") as f:
+                    f.truncate(end)  # drop a torn last record
+                size = end
+            if recovered and not self.readonly:
+                self._rewrite_index(number, entries)
+        self._segments[number] = [size, 0]
+        for flags, entry in entries:
+            self._apply(flags, entry)
+
+    def _read_index(self, number, seg_size):
+        # Returns ([(flags, ArchiveEntry)], end of the last indexed record).
+        entries = []
+        end = len(_SEGMENT_MAGIC)
+        try:
+            with open(self._segment_path(number, "idx"), "rb") as f:
+                blob = f.read()
+        except OSError:
+            return entries, end
+        if not blob.startswith(_INDEX_MAGIC):
+            return entries, end
+        pos = len(_INDEX_MAGIC)
+        while pos + _INDEX.size <= len(blob):
+            flags, key_len, offset, source_len, pdf_len = _INDEX.unpack_from(blob, pos)
+            key = blob[pos + _INDEX.size:pos + _INDEX.size + key_len]
+            if len(key) < key_len:
+                break
+            entry = ArchiveEntry(key.decode("utf-8"), number, offset, source_len, pdf_len)
+            if offset != end or offset + _record_size(entry) > seg_size:
+                break  # the index ran ahead of the segment; rescan from here
+            entries.append((flags, entry))
+            end = offset + _record_size(entry)
+            pos += _INDEX.size + key_len
+        return entries, end
+
+    def _scan(self, seg_path, start):
+        # Returns ([(flags, ArchiveEntry)], end of the last complete record) for records from start on.
+        number = int(os.path.basename(seg_path)[4:-4])
+        entries = []
+        with open(seg_path, "rb") as f:
+            f.seek(start)
+            pos = start
+            while True:
+                header = f.read(_RECORD.size)
+                if len(header) < _RECORD.size:
+                    break
+                magic, flags, key_len, source_len, pdf_len, crc = _RECORD.unpack(header)
+                if magic != _RECORD_MAGIC:
+                    break
+                payload = f.read(key_len + source_len + pdf_len)
+                if len(payload) < key_len + source_len + pdf_len or zlib.crc32(payload) != crc:
+                    break
+                entries.append((flags, ArchiveEntry(payload[:key_len].decode("utf-8"), number, pos,
+                                                    source_len, pdf_len)))
+                pos += _RECORD.size + len(payload)
+        return entries, pos
+
+    def _rewrite_index(self, number, entries):
+        idx_path = self._segment_path(number, "idx")
+        with open(f"{idx_path}.tmp", "wb") as f:
+            f.write(_INDEX_MAGIC)
+            for flags, entry in entries:
+                f.write(self._index_entry(flags, entry))
+        os.replace(f"{idx_path}.tmp", idx_path)
+
+    @staticmethod
+    def _index_entry(flags, entry):
+        key = entry.key.encode("utf-8")
+        return _INDEX.pack(flags, len(key), entry.offset, entry.source_len, entry.pdf_len) + key
+
+    def _apply(self, flags, entry):
+        # Index one record read or written in segment order: it supersedes any earlier one for its key.
+        old = self._index.pop(entry.key, None)
+        if old is not None:
+            self._segments[old.segment][1] -= _record_size(old)
+        if not flags & _TOMBSTONE:
+            self._index[entry.key] = entry
+            self._segments[entry.segment][1] += _record_size(entry)
+
+    # -- writing --------------------------------------------------------------
+
+    def _fits(self, number, need):
+        # An empty segment takes any record, however large.
+        size = self._segments[number][0]
+        return size + need <= self.segment_bytes or size == len(_SEGMENT_MAGIC)
+
+    def _open_writer(self, need):
+        if self._writer is not None:
+            if self._fits(self._writer[0], need):
+                return self._writer
+            self._close_writer()
+        number = max(self._segments, default=0)
+        if not number or number in self._sealed or not self._fits(number, need):
+            number += 1
+            with open(self._segment_path(number), "wb") as f:
+                f.write(_SEGMENT_MAGIC)
+            with open(self._segment_path(number, "idx"), "wb") as f:
+                f.write(_INDEX_MAGIC)
+            self._segments[number] = [len(_SEGMENT_MAGIC), 0]
+        self._writer = (number, open(self._segment_path(number), "ab"), open(self._segment_path(number, "idx"), "ab"))
+        return self._writer
+
+    def _write(self, key, source, pdf, flags=0):
+        if self.readonly:
+            raise PermissionError(f"archive {self.path} is open read-only")
+        key_bytes = key.encode("utf-8")
+        payload_len = len(key_bytes) + len(source) + len(pdf)
+        number, seg, idx = self._open_writer(_RECORD.size + payload_len)
+        crc = zlib.crc32(pdf, zlib.crc32(source, zlib.crc32(key_bytes)))
+        offset = self._segments[number][0]
+        seg.write(_RECORD.pack(_RECORD_MAGIC, flags, len(key_bytes), len(source), len(pdf), crc))
+        seg.write(key_bytes)
+        seg.write(source)
+        seg.write(pdf)
+        entry = ArchiveEntry(key, number, offset, len(source), len(pdf))
+        idx.write(self._index_entry(flags, entry))
+        self._segments[number][0] += _RECORD.size + payload_len
+        self._apply(flags, entry)
+        return entry
+
+    def append(self, key, pdf, source=None):
+        """Store a PDF (and optionally its source JSON bytes) under key; returns its ArchiveEntry."""
+        return self._write(key, source or b"", pdf)
+
+    def remove(self, key):
+        """Drop key from the archive (its space is reclaimed by compact()); returns whether it was present."""
+        if key not in self._index:
+            return False
+        self._write(key, b"", b"", _TOMBSTONE)
+        return True
+
+    def flush(self):
+        if self._writer is not None:
+            self._writer[1].flush()
+            self._writer[2].flush()
+
+    def _close_writer(self):
+        if self._writer is not None:
+            _, seg, idx = self._writer
+            seg.close()
+            idx.close()
+            self._writer = None
+
+    # -- reading --------------------------------------------------------------
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def entries(self, pattern=None):
+        """ArchiveEntry of every live planner, by key; pattern is an fnmatch pattern over keys."""
+        keys = sorted(self._index)
+        if pattern:
+            keys = fnmatch.filter(keys, pattern)
+        return [self._index[key] for key in keys]
+
+    def _view(self, entry, start, length):
+        if self._writer is not None and self._writer[0] == entry.segment:
+            self.flush()
+        end = entry.offset + start + length
+        mapped = self._maps.get(entry.segment)
+        if mapped is None or mapped[1] < end:
+            if mapped is not None:
+                self._release(entry.segment)
+            with open(self._segment_path(entry.segment), "rb") as f:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            mapped = self._maps[entry.segment] = (m, len(m))
+        return memoryview(mapped[0])[entry.offset + start:end]
+
+    def _release(self, number):
+        mapped = self._maps.pop(number, None)
+        if mapped is not None:
+            try:
+                mapped[0].close()
+            except BufferError:
+                pass  # a caller still holds a view; the map goes when it does
+
+    def pdf(self, key):
+        """The stored PDF as a read-only memoryview into the segment (no copy), or None."""
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        skip = _RECORD.size + len(entry.key.encode("utf-8")) + entry.source_len
+        return self._view(entry, skip, entry.pdf_len)
+
+    def source(self, key):
+        """The stored source JSON as a memoryview, or None (unknown key or stored without source)."""
+        entry = self._index.get(key)
+        if entry is None or not entry.source_len:
+            return None
+        return self._view(entry, _RECORD.size + len(entry.key.encode("utf-8")), entry.source_len)
+
+    # -- maintenance ----------------------------------------------------------
+
+    def stats(self):
+        total = sum(size for size, _ in self._segments.values())
+        live = sum(live for _, live in self._segments.values())
+        return {"entries": len(self._index), "segments": len(self._segments), "bytes": total, "live_bytes": live}
+
+    def compact(self, min_dead=0.25):
+        """Rewrite the segments whose share of dead bytes is at least min_dead; returns bytes reclaimed.
+
+        Live records are copied into new segments before the old files are
+        deleted, so a crash part-way leaves duplicates (resolved in favour of
+        the newer copy), never a loss.
+        """
+        victims = []
+        for number, (size, live) in sorted(self._segments.items()):
+            dead = size - len(_SEGMENT_MAGIC) - live
+            if dead > 0 and dead >= min_dead * (size - len(_SEGMENT_MAGIC)):
+                victims.append(number)
+        if not victims:
+            return 0
+        before = self.stats()["bytes"]
+        # Tombstones must outlive any older record of their key in a segment that stays.
+        kept_keys = set()
+        for number in self._segments:
+            if number not in victims and number < victims[-1]:
+                kept_keys.update(entry.key for _, entry in self._read_index(number, self._segments[number][0])[0])
+        self._close_writer()
+        self._sealed = victims
+        try:
+            for number in victims:
+                seg_path = self._segment_path(number)
+                for flags, entry in self._scan(seg_path, len(_SEGMENT_MAGIC))[0]:
+                    if flags & _TOMBSTONE:
+                        if entry.key in kept_keys and entry.key not in self._index:
+                            self._write(entry.key, b"", b"", _TOMBSTONE)
+                    elif self._index.get(entry.key) == entry:
+                        source = self.source(entry.key)
+                        self._write(entry.key, source if source is not None else b"", self.pdf(entry.key))
+            self._close_writer()
+            for number in victims:
+                self._release(number)
+                os.remove(self._segment_path(number))
+                try:
+                    os.remove(self._segment_path(number, "idx"))
+                except OSError:
+                    pass
+                del self._segments[number]
+        finally:
+            self._sealed = ()
+        return before - self.stats()["bytes"]
+
+    def close(self):
+        self._close_writer()
+        for number in list(self._maps):
+            self._release(number)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _extract_path(out_dir, key, ext):
+    parts = [part for part in key.split("/") if part not in ("", ".", "..")]
+    return os.path.join(out_dir, *parts) + ext
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="List, extract and compact packed planner archives")
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_cmd = commands.add_parser("list", help="Print the key and sizes of stored planners")
+    list_cmd.add_argument("archive", help="Archive directory")
+    list_cmd.add_argument("patterns", nargs="*", help="Key patterns, e.g. 'alice/2025-09-*' (default: all)")
+    extract_cmd = commands.add_parser("extract", help="Write stored planners out as PDF files")
+    extract_cmd.add_argument("archive", help="Archive directory")
+    extract_cmd.add_argument("patterns", nargs="+", help="Keys or key patterns to extract")
+    extract_cmd.add_argument("--out-dir", default="out", help="Written as OUT_DIR/<key>.pdf (default: out)")
+    extract_cmd.add_argument("--source", action="store_true", help="Also write the stored source JSON")
+    compact_cmd = commands.add_parser("compact", help="Reclaim space left by replaced and removed planners")
+    compact_cmd.add_argument("archive", help="Archive directory")
+    compact_cmd.add_argument("--min-dead", type=float, default=0.25,
+                             help="Rewrite segments at least this fraction dead (default: 0.25; 0 rewrites any with waste)")
+    return parser.parse_args()
+
+
+def _matching(archive, patterns):
+    seen = {}
+    for pattern in patterns or ["*"]:
+        for entry in archive.entries(pattern):
+            seen[entry.key] = entry
+    return [seen[key] for key in sorted(seen)]
+
+
+def main():
+    args = get_args()
+    if not os.path.isdir(args.archive):
+        print(f"[ERROR] no archive at {args.archive}")
+        sys.exit(1)
+    if args.command == "compact":
+        with PlannerArchive(args.archive) as archive:
+            reclaimed = archive.compact(args.min_dead)
+            stats = archive.stats()
+        print(f"Reclaimed {reclaimed} bytes; {stats['entries']} planners in {stats['segments']} segments ({stats['bytes']} bytes)")
+        return
+    with PlannerArchive(args.archive, readonly=True) as archive:
+        entries = _matching(archive, args.patterns)
+        if args.command == "list":
+            for entry in entries:
+                print(f"{entry.key}\t{entry.pdf_len}\t{entry.source_len}\tseg-{entry.segment:06d}")
+            return
+        if not entries:
+            print(f"[ERROR] no planners match {' '.join(args.patterns)}")
+            sys.exit(1)
+        for entry in entries:
+            pdf_path = _extract_path(args.out_dir, entry.key, ".pdf")
+            os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+            with open(pdf_path, "wb") as f:
+                f.write(archive.pdf(entry.key))
+            print(f"[OK] {entry.key} -> {pdf_path}")
+            source = archive.source(entry.key) if args.source else None
+            if source is not None:
+                with open(_extract_path(args.out_dir, entry.key, ".json"), "wb") as f:
+                    f.write(source)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+Planner render job queue.
+
+Jobs (day JSON plus an output path) are queued in a SQLite table and rendered
+by an asyncio runner that feeds a bounded pool of warm render processes:
+
+    python planner_jobs.py submit --input day.json --output out/day.pdf
+    python planner_jobs.py submit --batch days.jsonl --out-dir out
+    python planner_jobs.py run --workers 2
+    python planner_jobs.py status [--id N | --list failed]
+
+The runner only claims as many jobs as --workers plus --queue can hold, so
+a large backlog stays in the database instead of in memory. Invalid documents
+fail at once; renders that raise or exceed --timeout are retried with
+exponential backoff up to --retries times before the job is marked failed.
+--timeout counts from the moment a worker starts the render, and a worker
+that exceeds it is killed and replaced, so an abandoned render never runs
+alongside its retry. Database calls run on their own thread, off the event
+loop.
+
+Several runners may share a database. A runner leases the jobs it claims
+and renews the lease every LEASE_SECONDS / 3 while it holds them; only
+jobs whose lease has run out (their runner died) are requeued for others.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_DB = 'planner_jobs.db'
+LEASE_SECONDS = 30.0
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    payload TEXT NOT NULL,
+    output TEXT NOT NULL,
+    date_override TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    render_ms REAL,
+    output_bytes INTEGER,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    runner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, not_before, id);
+"""
+STATUSES = ('queued', 'running', 'done', 'failed')
+# Columns added since the first release, for databases created before them.
+_ADDED_COLUMNS = {'runner': 'TEXT', 'lease_until': 'REAL NOT NULL DEFAULT 0'}
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA_SQL)
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+    for name, decl in _ADDED_COLUMNS.items():
+        if name not in columns:
+            conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {decl}")
+    return conn
+
+
+def submit(conn, data, output_path, date_override=None):
+    """Queue one render job; returns its id."""
+    now = time.time()
+    cur = conn.execute(
+        "INSERT INTO jobs (payload, output, date_override, created, updated) VALUES (?, ?, ?, ?, ?)",
+        (json.dumps(data, ensure_ascii=False), output_path, date_override, now, now))
+    return cur.lastrowid
+
+
+def claim_next(conn, runner=None, lease=LEASE_SECONDS):
+    """Mark the oldest runnable queued job as running, leased to runner, and return its row (or None)."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' AND not_before <= ? ORDER BY id LIMIT 1", (now,)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, runner = ?, lease_until = ?, "
+                         "updated = ? WHERE id = ?", (runner, now + lease, now, row['id']))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return row
+
+
+def finish(conn, job_id, status, error=None, render_ms=None, output_bytes=None, not_before=0, runner=None):
+    """Record a job's outcome; with runner, only while that runner still holds the job. Returns whether it did."""
+    sql = ("UPDATE jobs SET status = ?, error = ?, render_ms = ?, output_bytes = ?, not_before = ?, runner = NULL, "
+           "lease_until = 0, updated = ? WHERE id = ?")
+    params = [status, error, render_ms, output_bytes, not_before, time.time(), job_id]
+    if runner is not None:
+        sql += " AND status = 'running' AND runner = ?"
+        params.append(runner)
+    return conn.execute(sql, params).rowcount == 1
+
+
+def renew_leases(conn, runner, lease=LEASE_SECONDS):
+    """Extend the lease on every job runner holds; returns how many."""
+    return conn.execute("UPDATE jobs SET lease_until = ? WHERE status = 'running' AND runner = ?",
+                        (time.time() + lease, runner)).rowcount
+
+
+def requeue_stale(conn):
+    """Return running jobs whose lease ran out (their runner died) to the queue; returns how many."""
+    now = time.time()
+    return conn.execute("UPDATE jobs SET status = 'queued', runner = NULL, lease_until = 0, updated = ? "
+                        "WHERE status = 'running' AND lease_until < ?", (now, now)).rowcount
+
+
+def _init_worker():
+    import planner_render
+    planner_render.get_styles()
+    planner_render.get_page_templates()
+
+
+def _render_job(data, output_path, date_override):
+    from planner_render import render_pdf
+    out_dir = os.path.dirname(output_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    render_pdf(data, output_path, date_override)
+    return (time.perf_counter() - started) * 1000.0, os.path.getsize(output_path)
+
+
+class JobRunner:
+    def __init__(self, db_path, schema_path, workers=2, queue_size=4, timeout=60.0, retries=2,
+                 backoff=2.0, poll=1.0):
+        from validate_json import read_schema, get_validator
+        self.db_path = db_path
+        self.schema = read_schema(schema_path)
+        get_validator(self.schema)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.poll = poll
+        self.runner_id = uuid.uuid4().hex
+        self.conn = None
+        self.db = None
+        self.pool = None
+        self.busy = 0
+        self.done = 0
+        self.failed = 0
+
+    async def _db_call(self, fn, *args):
+        # SQLite calls block (BEGIN IMMEDIATE waits up to 30 s for the lock), so
+        # they run on one dedicated thread, which also owns the connection.
+        return await asyncio.get_running_loop().run_in_executor(self.db, fn, *args)
+
+    async def run(self, once=False):
+        """Process jobs until interrupted, or until the queue is drained with once=True."""
+        from planner_pool import WorkerPool
+        self.db = ThreadPoolExecutor(max_workers=1, thread_name_prefix='planner-jobs-db')
+        self.conn = await self._db_call(connect, self.db_path)
+        self.pool = WorkerPool(self.workers, _init_worker)
+        # Claimed jobs wait here for a render slot; put() blocks when it is full,
+        # which stops the claimer from pulling more rows out of the database.
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        tasks = [asyncio.create_task(self._worker(queue)) for _ in range(self.workers)]
+        tasks.append(asyncio.create_task(self._renew_leases()))
+        try:
+            while True:
+                recovered = await self._db_call(requeue_stale, self.conn)
+                if recovered:
+                    print(f"Requeued {recovered} job(s) whose runner stopped renewing its lease")
+                row = await self._db_call(claim_next, self.conn, self.runner_id)
+                if row is not None:
+                    await queue.put(row)
+                    continue
+                if once and queue.empty() and not self.busy and not await self._db_call(self._has_pending):
+                    break
+                await asyncio.sleep(self.poll)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.pool.shutdown()
+            await self._db_call(self.conn.close)
+            self.db.shutdown()
+
+    def _has_pending(self):
+        # Queued jobs (including those waiting out a retry backoff) and jobs other runners are rendering.
+        return self.conn.execute("SELECT 1 FROM jobs WHERE status = 'queued' OR (status = 'running' AND runner != ?) "
+                                 "LIMIT 1", (self.runner_id,)).fetchone() is not None
+
+    async def _renew_leases(self):
+        while True:
+            await asyncio.sleep(LEASE_SECONDS / 3)
+            await self._db_call(renew_leases, self.conn, self.runner_id)
+
+    async def _finish(self, job_id, status, error=None, render_ms=None, output_bytes=None, not_before=0):
+        held = await self._db_call(finish, self.conn, job_id, status, error, render_ms, output_bytes, not_before,
+                                   self.runner_id)
+        if not held:
+            print(f"[WARN] job {job_id}: lease lost to another runner, result not recorded")
+        return held
+
+    async def _worker(self, queue):
+        while True:
+            row = await queue.get()
+            self.busy += 1
+            try:
+                await self._process(row)
+            finally:
+                self.busy -= 1
+                queue.task_done()
+
+    async def _process(self, row):
+        from validate_json import collect_errors
+        job_id = row['id']
+        try:
+            data = json.loads(row['payload'])
+        except ValueError as e:
+            await self._fail(job_id, f"invalid JSON payload: {e}")
+            return
+        errors = collect_errors(data, self.schema)
+        if errors:
+            await self._fail(job_id, "validation failed: " + "; ".join(errors))
+            return
+        try:
+            # One _worker task per pool process, so an idle worker is always
+            # free here and the timeout starts with the render itself.
+            render_ms, output_bytes = await asyncio.to_thread(
+                self.pool.call, _render_job, data, row['output'], row['date_override'], timeout=self.timeout)
+        except TimeoutError:
+            # The pool has killed and replaced the worker: the retry cannot race this attempt.
+            await self._retry_or_fail(row, f"render timed out after {self.timeout:g}s")
+            return
+        except Exception as e:
+            await self._retry_or_fail(row, f"render failed: {e}")
+            return
+        if not await self._finish(job_id, 'done', render_ms=render_ms, output_bytes=output_bytes):
+            return
+        self.done += 1
+        print(f"[OK] job {job_id} -> {row['output']} ({render_ms:.1f} ms)")
+
+    async def _retry_or_fail(self, row, error):
+        attempts = row['attempts'] + 1  # the row was read before claim_next counted this attempt
+        if attempts > self.retries:
+            await self._fail(row['id'], error)
+            return
+        delay = self.backoff * 2 ** (attempts - 1)
+        if not await self._finish(row['id'], 'queued', error, not_before=time.time() + delay):
+            return
+        print(f"[RETRY] job {row['id']}: {error} (attempt {attempts}, retrying in {delay:g}s)")
+
+    async def _fail(self, job_id, error):
+        if not await self._finish(job_id, 'failed', error):
+            return
+        self.failed += 1
+        print(f"[ERROR] job {job_id}: {error}")
+
+
+def print_status(conn, job_id=None, list_status=None):
+    if job_id is not None:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            print(f"[ERROR] No job with id {job_id}")
+            return 1
+        for key in row.keys():
+            if key != 'payload':
+                print(f"{key}: {row[key]}")
+        return 0
+    if list_status:
+        for row in conn.execute("SELECT id, output, attempts, error FROM jobs WHERE status = ? ORDER BY id", (list_status,)):
+            note = f" - {row['error']}" if row['error'] else ""
+            print(f"{row['id']}: {row['output']} (attempts {row['attempts']}){note}")
+        return 0
+    counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+    print(", ".join(f"{status}: {counts.get(status, 0)}" for status in STATUSES))
+    return 0
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Astro Planner render job queue")
+    parser.add_argument('--db', default=DEFAULT_DB, help=f'SQLite job database (default: {DEFAULT_DB})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    sub = commands.add_parser('submit', help='Queue render jobs')
+    sub.add_argument('--input', help='Day JSON to render')
+    sub.add_argument('--output', help='Output PDF path for --input')
+    sub.add_argument('--batch', help='Queue every record of a directory, glob, .jsonl file or - (stdin)')
+    sub.add_argument('--out-dir', default='out', help='Output directory for --batch (default: out)')
+    sub.add_argument('--date', help='Override date for header')
+    run = commands.add_parser('run', help='Render queued jobs')
+    run.add_argument('--workers', type=int, default=2, help='Warm render processes (default: 2)')
+    run.add_argument('--queue', type=int, default=4, help='Claimed jobs allowed to wait for a worker (default: 4)')
+    run.add_argument('--timeout', type=float, default=60.0, help='Seconds before a render attempt is abandoned (default: 60)')
+    run.add_argument('--retries', type=int, default=2, help='Retries after a failed or timed-out render (default: 2)')
+    run.add_argument('--backoff', type=float, default=2.0, help='Seconds before the first retry, doubled each time (default: 2)')
+    run.add_argument('--poll', type=float, default=1.0, help='Seconds between polls of an empty queue (default: 1)')
+    run.add_argument('--once', action='store_true', help='Exit when no queued or retrying jobs remain')
+    run.add_argument('--schema', default=None, help='Schema JSON (default: schema.json next to the generator)')
+    status = commands.add_parser('status', help='Show job counts or details')
+    status.add_argument('--id', type=int, help='Show one job')
+    status.add_argument('--list', choices=STATUSES, help='List jobs with this status')
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    if args.command == 'submit':
+        conn = connect(args.db)
+        if args.batch:
+            from planner_render import iter_day_documents
+            queued = skipped = 0
+            for name, data, error in iter_day_documents(args.batch):
+                if error:
+                    skipped += 1
+                    print(f"[ERROR] {name}: {error}")
+                    continue
+                submit(conn, data, os.path.join(args.out_dir, f"{name}.pdf"), args.date)
+                queued += 1
+            print(f"Queued {queued} job(s), skipped {skipped}.")
+            sys.exit(1 if skipped else 0)
+        if not args.input or not args.output:
+            print("[ERROR] submit needs --input and --output, or --batch")
+            sys.exit(1)
+        from validate_json import load_json
+        print(f"Queued job {submit(conn, load_json(args.input), args.output, args.date)}")
+    elif args.command == 'run':
+        schema_path = args.schema or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.json')
+        runner = JobRunner(args.db, schema_path, args.workers, args.queue, args.timeout, args.retries,
+                           args.backoff, args.poll)
+        try:
+            asyncio.run(runner.run(once=args.once))
+        except KeyboardInterrupt:
+            pass
+        print(f"Runner stopped: {runner.done} done, {runner.failed} failed")
+    else:
+        conn = connect(args.db)
+        sys.exit(print_status(conn, args.id, args.list))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Process-pool helpers shared by the planner batch tools
+"""
+import multiprocessing
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def make_pool(workers, initializer=None, initargs=()):
+    return ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+
+
+def ordered_map(executor, fn, arg_tuples, window):
+    """Run fn(*args) for each tuple on the executor and yield results in input order.
+
+    Unlike Executor.map, at most `window` tasks are in flight at once, so a long
+    (or endless) input stream is never materialised in memory.
+    """
+    pending = deque()
+    for args in arg_tuples:
+        pending.append(executor.submit(fn, *args))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _serve(conn, initializer, initargs):
+    # Worker process loop: run each (fn, args) sent and reply (ok, result or exception).
+    if initializer is not None:
+        initializer(*initargs)
+    conn.send((True, None))  # ready
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        fn, args = job
+        try:
+            reply = (True, fn(*args))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:  # an unpicklable result or exception
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class _Worker:
+    def __init__(self, context, initializer, initargs):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child, initializer, initargs), daemon=True)
+        self.process.start()
+        child.close()
+        self.ready = False
+
+    def call(self, fn, args, timeout):
+        if not self.ready:
+            self.conn.recv()  # the initializer has run; not counted against the timeout
+            self.ready = True
+        self.conn.send((fn, args))
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"call did not finish in {timeout:g}s")
+        ok, value = self.conn.recv()
+        if not ok:
+            raise value
+        return value
+
+    def stop(self, kill=False):
+        if not kill:
+            try:
+                self.conn.send(None)
+            except OSError:
+                kill = True
+            else:
+                self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """Warm worker processes that each run one call at a time and can be killed mid-call.
+
+    call() waits for an idle worker, so a call's timeout only runs while its
+    worker is executing it. A worker whose call times out (or that dies) is
+    killed and replaced before call() raises, so abandoned calls never keep
+    running alongside their retries and the pool never holds more than
+    `workers` processes. Blocking; asyncio callers use asyncio.to_thread.
+
+    Workers are started with the spawn method: replacements are started from
+    request or to_thread threads, and forking a threaded process can copy a
+    held lock into the child.
+    """
+    def __init__(self, workers, initializer=None, initargs=()):
+        context = multiprocessing.get_context("spawn")
+        self._spawn = lambda: _Worker(context, initializer, initargs)
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(workers):
+            worker = self._spawn()
+            self._workers.add(worker)
+            self._idle.put(worker)
+
+    def call(self, fn, *args, timeout=None):
+        worker = self._idle.get()
+        try:
+            return worker.call(fn, args, timeout)
+        except (TimeoutError, EOFError, OSError) as e:
+            with self._lock:
+                self._workers.discard(worker)
+            worker.stop(kill=True)
+            with self._lock:
+                if not self._closed:
+                    worker = self._spawn()
+                    self._workers.add(worker)
+            if isinstance(e, TimeoutError):
+                raise
+            raise RuntimeError("worker process exited") from e
+        finally:
+            self._idle.put(worker)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            workers, self._workers = self._workers, set()
+        for worker in workers:
+            worker.stop(kill=not worker.ready)
@@ -0,0 +1,1245 @@
+"""
+Astro Planner 4-page PDF renderer: fonts, styles, page templates, page
+builders and the single/volume/batch render functions. The command line
+lives in generate_planner_pdf.py, which imports this module only once its
+arguments call for a render.
+"""
+import os
+import sys
+import glob
+import json
+import time
+from functools import lru_cache
+from itertools import islice
+from contextlib import nullcontext
+from io import BytesIO
+from collections import namedtuple, OrderedDict
+from reportlab import rl_config
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import (
+    BaseDocTemplate, PageTemplate, Frame, Paragraph, Spacer, PageBreak, FrameBreak, NextPageTemplate, Flowable, ActionFlowable
+)
+from reportlab.pdfbase import pdfmetrics, pdfdoc
+from reportlab.pdfbase.pdfmetrics import registerFontFamily
+from reportlab.lib import colors
+from font_cache import CachedTTFont, reset_glyph_usage, glyph_usage
+from render_cache import RenderCache, DEFAULT_MAX_BYTES, file_fingerprint, content_hash
+from page_cache import CachedPage
+import image_assets
+from image_assets import prepared_image
+import output_profiles
+from output_profiles import PROFILES, get_profile
+from validate_json import load_schema
+from day_model import Model, build_day, to_day
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FONT_DIR = os.path.join(BASE_DIR, 'fonts')
+SCHEMA_PATH = os.path.join(BASE_DIR, 'schema.json')
+PLANNER_FONTS = []  # every face registered by register_fonts; output profiles adjust their subsetting
+HAS_SYMBOLA = False
+
+def _load_font(name, filename):
+    font = CachedTTFont(name, os.path.join(FONT_DIR, filename))
+    PLANNER_FONTS.append(font)
+    return font
+
+# Font registration (parsed faces come from the on-disk cache in font_cache).
+# Runs on first use from get_styles/get_page_templates, not at import.
+def register_fonts():
+    global HAS_SYMBOLA
+    if PLANNER_FONTS:
+        return
+    pdfmetrics.registerFont(_load_font("DejaVu", "DejaVuSans.ttf"))
+    pdfmetrics.registerFont(_load_font("DejaVu-Bold", "DejaVuSans-Bold.ttf"))
+    pdfmetrics.registerFont(_load_font("DejaVu-Oblique", "DejaVuSans-Oblique.ttf"))
+    pdfmetrics.registerFont(_load_font("DejaVu-BoldOblique", "DejaVuSans-BoldOblique.ttf"))
+    try:
+        pdfmetrics.registerFont(_load_font("Symbola", "Symbola.ttf"))
+        HAS_SYMBOLA = True
+    except Exception:
+        HAS_SYMBOLA = False
+    # Header date face (registered under the name draw_header uses)
+    pdfmetrics.registerFont(_load_font("DejaVuSans-Bold", "DejaVuSans-Bold.ttf"))
+    registerFontFamily("DejaVu",
+        normal="DejaVu",
+        bold="DejaVu-Bold",
+        italic="DejaVu-Oblique",
+        boldItalic="DejaVu-BoldOblique")
+
+# Section divider
+class CustomSectionDivider(Flowable):
+    def __init__(self, width="100%", thickness=0.5, color=colors.HexColor('#B0B0B0'), spaceBefore=8, spaceAfter=8):
+        super().__init__()
+        self.width = width
+        self.thickness = thickness
+        self.color = color
+        self.spaceBefore = spaceBefore
+        self.spaceAfter = spaceAfter
+    def wrap(self, availWidth, availHeight):
+        self._width = availWidth if self.width == "100%" else float(self.width)
+        return self._width, self.spaceBefore + self.spaceAfter
+    def draw(self):
+        y = 0
+        x1 = 0
+        x2 = self._width
+        canv = self.canv
+        canv.saveState()
+        canv.setStrokeColor(self.color)
+        canv.setLineWidth(self.thickness)
+        deco_font = "Helvetica"
+        deco_font_size = 13
+        star_width = canv.stringWidth('\u2727', deco_font, deco_font_size)
+        canv.line(x1 + star_width + 2, y, x2 - star_width - 2, y)
+        canv.setFont(deco_font, deco_font_size)
+        canv.setFillColor(self.color)
+        canv.drawString(x1, y - deco_font_size/3, '\u2727')
+        canv.drawString(x2 - star_width, y - deco_font_size/3, '\u2727')
+        canv.restoreState()
+
+# Lined journal area for the evening page; the rules are drawn once per
+# document into a form and re-placed wherever the flowable lands.
+class JournalLines(Flowable):
+    def __init__(self, n_lines=16, left=0.1*inch, right=0.1*inch, spacing=18):
+        super().__init__()
+        self.n_lines = n_lines
+        self.left = left
+        self.right = right
+        self.spacing = spacing
+    def wrap(self, availWidth, availHeight):
+        self._width = availWidth
+        self._height = self.n_lines * self.spacing
+        return self._width, self._height
+    def _draw_lines(self, canv):
+        canv.setStrokeColor(colors.HexColor('#CCCCCC'))
+        canv.setLineWidth(0.5)
+        y = 0
+        for i in range(self.n_lines):
+            canv.line(self.left, y, self._width - self.right, y)
+            y -= self.spacing
+    def draw(self):
+        name = f"planner_journal_{self.n_lines}_{self.spacing}_{self._width:.2f}"
+        bbox = (0, -self.n_lines * self.spacing, self._width, 1)
+        draw_chrome(self.canv, name, self._draw_lines, bbox=bbox)
+
+class StaticParagraph(Paragraph):
+    """Paragraph for fixed label text, shared by every document in the process.
+
+    The markup is parsed once and line breaking is memoised per available width.
+    """
+    def __init__(self, text, style, *args, **kwargs):
+        # Paragraph.split builds its halves through self.__class__.
+        super().__init__(text, style, *args, **kwargs)
+        self._wrapped = {}
+
+    def wrap(self, availWidth, availHeight):
+        cached = self._wrapped.get(availWidth)
+        if cached is None:
+            super().wrap(availWidth, availHeight)
+            cached = self._wrapped[availWidth] = (self.blPara, self.height, self._wrapWidths)
+        self.width = availWidth
+        self.blPara, self.height, self._wrapWidths = cached
+        return self.width, self.height
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        super().drawOn(canvas, x, y, _sW)
+        # doc.build only clears this in multiBuild; a stale flag would make the
+        # next document treat the label as too large for any frame.
+        self.__dict__.pop('_postponed', None)
+
+# Static labels by (text, style); see static_para.
+_STATIC_PARAS = {}
+
+def static_para(text, style):
+    """Return the shared StaticParagraph for a fixed label, building it on first use."""
+    key = (text, style)
+    para = _STATIC_PARAS.get(key)
+    if para is None:
+        para = _STATIC_PARAS[key] = StaticParagraph(text, style)
+    return para
+
+# Data paragraphs of the fixed-shape pages by (text, style), least recently used
+# first; days in a batch repeat many values (timing windows, kitchen staples).
+_FIELD_PARAS = OrderedDict()
+FIELD_PARA_CACHE_SIZE = 2048
+
+def field_para(text, style):
+    """Return a shared, wrap-memoising paragraph for one field of pages 2-4."""
+    key = (text, style)
+    para = _FIELD_PARAS.get(key)
+    if para is None:
+        para = _FIELD_PARAS[key] = StaticParagraph(text, style)
+        if len(_FIELD_PARAS) > FIELD_PARA_CACHE_SIZE:
+            _FIELD_PARAS.popitem(last=False)
+    else:
+        _FIELD_PARAS.move_to_end(key)
+    return para
+
+class FastBlock(Flowable):
+    """Lays out a frame's worth of flowables as one unit and draws them directly.
+
+    Positions follow Frame's spacing rules, so output matches the normal flow.
+    If the children do not fit the available height, split() hands them back
+    to platypus to flow across frames as usual.
+    """
+    def __init__(self, children):
+        super().__init__()
+        self.children = children
+        self._placed = []
+
+    def getSpaceBefore(self):
+        return self.children[0].getSpaceBefore() if self.children else 0
+
+    def getSpaceAfter(self):
+        return self.children[-1].getSpaceAfter() if self.children else 0
+
+    def wrap(self, availWidth, availHeight):
+        overlap = getattr(getattr(self, '_frame', None), '_oASpace', rl_config.overlapAttachedSpace)
+        placed = []
+        y = 0
+        prev_after = 0
+        for i, child in enumerate(self.children):
+            space = 0
+            if i:
+                space = child.getSpaceBefore()
+                if overlap:
+                    space = max(space - prev_after, 0)
+            w, h = child.wrap(availWidth, availHeight - y - space)
+            y += space + h
+            placed.append((child, y, availWidth - w))
+            prev_after = child.getSpaceAfter()
+            y += prev_after
+        self.width = availWidth
+        # The frame applies the last child's spaceAfter itself.
+        self.height = y - prev_after
+        self._placed = placed
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        if self.children and self.children[0].wrap(availWidth, availHeight)[1] > availHeight:
+            return []
+        return list(self.children)
+
+    def draw(self):
+        for child, bottom, slack in self._placed:
+            child.drawOn(self.canv, 0, self.height - bottom, _sW=slack)
+
+############################################################
+# HEADER/FOOTER DRAWING (LOCKED FOR ALL PAGES)
+#
+# The draw_header function below defines the ONLY header style for all pages.
+# Do not modify this function except for global header changes.
+# All PageTemplates must use this header for consistency.
+#
+# If you need to change the header, update this function and re-test all pages.
+############################################################
+# Header/footer drawing
+HEADER_HEIGHT = 32
+MARGIN = 0.6 * inch
+CRYSTAL_BALL_PATH = os.path.join(BASE_DIR, 'assets', 'CrystalBall.png')
+HAS_CRYSTAL_BALL = os.path.exists(CRYSTAL_BALL_PATH)
+CRYSTAL_BALL_SIZE = 36  # pt
+# Static page chrome is drawn once per document into a named form XObject and
+# then placed by reference (canvas.doForm) on every page that needs it.
+def draw_chrome(canvas, name, draw_fn, *args, bbox=None):
+    if not canvas.hasForm(name):
+        if bbox:
+            canvas.beginForm(name, *bbox)
+        else:
+            canvas.beginForm(name)
+        draw_fn(canvas, *args)
+        # Kept so page content replayed from a PageCache can re-create the form.
+        canvas.__dict__.setdefault('_chrome_forms', {})[name] = (bbox or (), list(canvas._code))
+        canvas.endForm()
+    canvas.doForm(name)
+
+def header_image():
+    """The crystal ball resampled for its header slot at the output profile's dpi (decoded once per process)."""
+    return prepared_image(CRYSTAL_BALL_PATH, CRYSTAL_BALL_SIZE, CRYSTAL_BALL_SIZE, get_profile().image_dpi)
+
+def _header_chrome(canvas, doc):
+    """Crystal ball logo and the star-capped rule under the header."""
+    left_x = doc.leftMargin
+    right_x = doc.leftMargin + doc.width
+    y = doc.height + doc.bottomMargin + 10
+    # Draw crystal ball image at left edge of header, always
+    crystal_ball_size = CRYSTAL_BALL_SIZE
+    # Top-align the image with the date text
+    date_font_size = 12
+    date_y = y  # Baseline of date text
+    # Calculate the top of the date text
+    date_top_y = date_y + date_font_size
+    crystal_ball_y = date_top_y - crystal_ball_size
+    if HAS_CRYSTAL_BALL:
+        canvas.drawImage(header_image(), left_x, crystal_ball_y, width=crystal_ball_size, height=crystal_ball_size, mask='auto')
+
+    # Decorative line below header with diamond/star symbols
+    symbol = '\u2726'  # Unicode sparkle/diamond
+    symbol_font = 'Symbola' if HAS_SYMBOLA else 'Helvetica'
+    symbol_size = 16
+    symbol_width = canvas.stringWidth(symbol, symbol_font, symbol_size)
+    # Move the line further down for more space (additional 20 points)
+    line_y = date_y - 43  # Raise line by 1 more point
+    # Center the whole group (star + gap + line + gap + star)
+    gap = 6
+    line_length = right_x - left_x - 2 * (symbol_width + gap)
+    group_width = 2 * symbol_width + 2 * gap + line_length
+    group_left = left_x + (right_x - left_x - group_width) / 2
+    # Draw diamond/star symbols at each end, raised by 3 points, as outlined (border only, white fill)
+    left_star_x = group_left
+    right_star_x = group_left + symbol_width + gap + line_length + gap
+    star_y = line_y - 4
+    soft_grey = colors.HexColor('#B0B0B0')
+    # Draw white fill first (slightly smaller)
+    canvas.setFont(symbol_font, symbol_size - 1)
+    canvas.setFillColor(colors.white)
+    canvas.drawString(left_star_x + 0.5, star_y + 0.5, symbol)
+    canvas.drawString(right_star_x + 0.5, star_y + 0.5, symbol)
+    # Draw border in soft gray (slightly larger)
+    canvas.setFont(symbol_font, symbol_size + 1)
+    canvas.setFillColor(soft_grey)
+    canvas.drawString(left_star_x - 1, star_y - 1, symbol)
+    canvas.drawString(right_star_x - 1, star_y - 1, symbol)
+    # Draw horizontal line between the stars, bold and darker gray
+    # Use the same soft gray for both the line and the stars
+    canvas.setStrokeColor(soft_grey)
+    canvas.setLineWidth(1.2)
+    line_start = left_star_x + symbol_width + gap
+    line_end = right_star_x - gap
+    canvas.line(line_start, line_y, line_end, line_y)
+
+def draw_header(canvas, doc, day):
+    #
+    # NOTE: This header is used on ALL pages. Do not override or bypass this function.
+    #
+    draw_chrome(canvas, 'planner_header', _header_chrome, doc)
+    left_x = doc.leftMargin
+    right_x = doc.leftMargin + doc.width
+    mid_x = (left_x + right_x) / 2.0
+    y = doc.height + doc.bottomMargin + 10
+    canvas.saveState()
+    # Left: Date (bold, Month-DD-YYYY), to the right of the crystal ball
+    date_x = left_x + 36 + 11
+    canvas.setFont('DejaVuSans-Bold', 12)
+    canvas.setFillColor(colors.black)
+    canvas.drawString(date_x, y, day.date_text)
+    # Draw day of week on the right, same line
+    if day.weekday:
+        canvas.drawRightString(right_x, y, day.weekday)
+    # Center: Moon icon, lunar cycle, zodiac (move down by one line)
+    phase_full = day.moon_phase_sign
+    moon_emoji = day.moon_emoji
+    y_center = y - 16 - 16  # move down by one more line (16pt)
+    moon_font = "Symbola" if HAS_SYMBOLA else "Helvetica"
+    moon_w = canvas.stringWidth(moon_emoji, moon_font, 14)
+    phase_w = canvas.stringWidth(phase_full, "Helvetica-Oblique", 11)
+    total_w = moon_w + 6 + phase_w
+    start_x = mid_x - total_w / 2
+    canvas.setFont(moon_font, 14)
+    canvas.drawString(start_x, y_center, moon_emoji)
+    canvas.setFont("Helvetica-Oblique", 11)
+    canvas.drawString(start_x + moon_w + 6, y_center, phase_full)
+    canvas.restoreState()
+
+def _footer_chrome(canvas, doc):
+    canvas.setFont("DejaVu-Oblique", 9)
+    canvas.setFillColor(colors.HexColor('#888888'))
+    canvas.drawCentredString(doc.leftMargin + doc.width/2, doc.bottomMargin - 8, "✦ As above, so below ✦")
+
+def draw_footer(canvas, doc, day):
+    draw_chrome(canvas, 'planner_footer', _footer_chrome, doc)
+
+def draw_continued(canvas, doc, title):
+    # Overflow pages of a section say so at the right of the footer.
+    canvas.saveState()
+    canvas.setFont("DejaVu-Oblique", 8)
+    canvas.setFillColor(colors.HexColor('#888888'))
+    canvas.drawRightString(doc.leftMargin + doc.width, doc.bottomMargin - 8, f"{title} (continued)")
+    canvas.restoreState()
+
+def _column_divider_chrome(canvas, doc):
+    # Vertical divider at mid_x between the page-3 columns
+    mid_x = doc.leftMargin + (doc.width)/2
+    y0 = doc.bottomMargin
+    y1 = doc.bottomMargin + doc.height
+    canvas.setStrokeColor(colors.HexColor('#B0B0B0'))
+    canvas.setLineWidth(0.5)
+    canvas.line(mid_x, y0, mid_x, y1)
+
+def draw_column_divider(canvas, doc):
+    draw_chrome(canvas, 'planner_column_divider', _column_divider_chrome, doc)
+
+# --- PAGE RENDERERS ---
+# Builders are generators: they yield a page's flowables as layout asks for
+# them, so list items are created just before they are placed and dropped
+# once drawn. Lists have no upper bound; overflow continues on further pages
+# with the same template.
+
+# Lists on the fixed-shape pages longer than this are streamed after the
+# page's FastBlock instead of being held in it.
+BLOCK_LIST_ITEMS = 32
+
+def _stream_list(block, items, markup, style):
+    """Add a paragraph per item to block (FastBlock children), or stream a long list.
+
+    For a long list the block so far is yielded and cleared, then the items
+    follow one at a time.
+    """
+    if len(items) <= BLOCK_LIST_ITEMS:
+        block.extend(field_para(markup.format(item), style) for item in items)
+        return
+    if block:
+        yield FastBlock(list(block))
+        block.clear()
+    for item in items:
+        yield Paragraph(markup.format(item), style)
+
+def iter_page_1_horoscope(day, styles):
+    yield static_para("✦ HOROSCOPE ✦", styles['H1'])
+    # Add planet of the day at the top of the Horoscope body
+    if day.day_planet:
+        yield Paragraph(f"<b>Planet of the Day:</b> {day.day_planet}", styles['Body'])
+    h = day.horoscope
+    # 1. Transit Summary
+    if any(h.transit_summary):
+        yield static_para("<b>Transit Summary</b>", styles['Label'])
+        for item in h.transit_summary:
+            if item:
+                yield Paragraph(f"• {item}", styles['Body'])
+    # 2. Upcoming Events
+    if h.upcoming_events:
+        yield static_para("<b>Upcoming Events</b>", styles['Label'])
+        for ev in h.upcoming_events:
+            yield Paragraph(f"<b>{ev.when}:</b> {ev.text}", styles['Body'])
+    # 3. Focus of the Day
+    focus = h.focus_of_day
+    if focus:
+        yield static_para("<b>Focus of the Day</b>", styles['Label'])
+        for k, label in [('dos', "Do's"), ('donts', "Don'ts"), ('opportunities', "Opportunities"), ('warnings', "Warnings")]:
+            focus_items = getattr(focus, k)
+            if focus_items:
+                yield static_para(f"<b>{label}:</b>", styles['Label'])
+                for item in focus_items:
+                    yield Paragraph(f"• {item}", styles['Body'])
+    # 4. Practical Task List
+    if any(h.task_list):
+        yield static_para("<b>Practical Task List</b>", styles['Label'])
+        for item in h.task_list:
+            if item:
+                yield Paragraph(f"☐ {item}", styles['Body'])
+    # 5. Creative Flow
+    cf = h.creative_flow
+    if cf:
+        yield static_para("<b>Creative Flow of the Day</b>", styles['Label'])
+        for k, label in [('project', 'Project'), ('mode', 'Mode'), ('time_box', 'Time Box'), ('bonus', 'Bonus')]:
+            val = getattr(cf, k)
+            if val:
+                yield Paragraph(f"<b>{label}:</b> {val}", styles['Body'])
+    yield Spacer(1, 8)
+
+def iter_page_2_rituals(day, styles):
+    block = [static_para("✦ RITUAL KIT ✦", styles['H1'])]
+    rk = day.rituals
+    checklist = rk.checklist
+    # Checklist
+    block.append(static_para("<b>Checklist</b>", styles['Label']))
+    for k, label in [('candle', 'Candle'), ('oil', 'Oil'), ('crystal', 'Crystal'), ('herb_incense', 'Herb/Incense')]:
+        val = getattr(checklist, k)
+        if val:
+            block.append(field_para(f"☐ <b>{label}:</b> {val}", styles['Body']))
+    yield from _stream_list(block, checklist.extras, "☐ <b>Extra:</b> {}", styles['Body'])
+    block.append(Spacer(1, 6))
+    # Timing blocks: casting, manifesting, releasing
+    for block_name in ['casting', 'manifesting', 'releasing']:
+        timing = getattr(rk, block_name)
+        if timing:
+            block.append(field_para(f"<b>{block_name.capitalize()}</b> <i>({timing.window})</i>", styles['Label']))
+            block.append(field_para(f"<b>Intent:</b> {timing.intent}", styles['Body']))
+            if timing.why:
+                block.append(field_para(f"<b>Why:</b> {timing.why}", styles['Body']))
+            block.append(Spacer(1, 2))
+    # Notes
+    if rk.notes:
+        block.append(static_para("<b>Notes/Adaptations:</b>", styles['Label']))
+        block.append(field_para(rk.notes, styles['Body']))
+    block.append(Spacer(1, 8))
+    yield FastBlock(block)
+
+def iter_page_3_chores_kitchen(day, styles):
+    chores = day.chores
+    kitchen = day.kitchen
+    # Left column: Chores
+    left = [static_para("✦ CHORES ✦", styles['H1'])]
+    if chores.energy_of_day:
+        left.append(field_para(f"<b>Energy of the Day:</b> {chores.energy_of_day}", styles['Body']))
+    for k, label in [('indoor_large', 'Big'), ('indoor_small', 'Small'), ('outdoor', 'Outdoor'), ('plants', 'Plants')]:
+        val = getattr(chores.to_do, k)
+        if val:
+            left.append(static_para(f"<b>{label} Chores:</b>", styles['Label']))
+            left.append(field_para(f"☐ {val}", styles['Body']))
+    if chores.laundry_focus:
+        left.append(field_para(f"<b>Laundry Focus:</b> {chores.laundry_focus}", styles['Body']))
+    if chores.avoid:
+        left.append(static_para("<b>Chores to Avoid:</b>", styles['Label']))
+        yield from _stream_list(left, chores.avoid, "• {}", styles['Body'])
+    if chores.shopping_check:
+        left.append(field_para(f"<b>Shopping Check:</b> {chores.shopping_check}", styles['Body']))
+    if left:
+        yield FastBlock(left)
+    # Move to right column
+    yield FrameBreak()
+    # Right column: Kitchen
+    right = [static_para("✦ KITCHEN ✦", styles['H1'])]
+    for k, label in [('tea_of_day', 'Tea of the Day'), ('breakfast', 'Breakfast'), ('lunch', 'Lunch'), ('dinner', 'Dinner'), ('snack_prep', 'Snack/Prep')]:
+        val = getattr(kitchen, k)
+        if val:
+            right.append(field_para(f"<b>{label}:</b> {val}", styles['Body']))
+    if kitchen.notes:
+        right.append(field_para(f"<b>Notes:</b> {kitchen.notes}", styles['Body']))
+    right.append(Spacer(1, 8))
+    yield FastBlock(right)
+
+def iter_page_4_evening(day, styles):
+    block = [static_para("✦ EVENING REFLECTION ✦", styles['H1'])]
+    er = day.evening_reflection
+    for i, label in [(1, 'Prompt 1'), (2, 'Prompt 2')]:
+        val = getattr(er, f'prompt{i}')
+        if val:
+            block.append(field_para(f"<b>{label}:</b> {val}", styles['Body']))
+        else:
+            block.append(static_para(f"<b>{label}:</b> ", styles['Body']))
+            for _ in range(2):
+                block.append(Spacer(1, 12))
+    # Lined journal area
+    block.append(Spacer(1, 10))
+    block.append(JournalLines())
+    block.append(Spacer(1, 8))
+    yield FastBlock(block)
+
+# --- MAIN PDF GENERATION ---
+# Styles and page templates are built once per process and shared by every
+# render_pdf call; the onPage callbacks read the current day from doc.planner_data.
+_STYLES = None
+_PAGE_TEMPLATES = None
+
+def get_styles():
+    global _STYLES
+    if _STYLES is None:
+        register_fonts()
+        styles = getSampleStyleSheet()
+        styles.add(ParagraphStyle(name='H1', fontName="DejaVu-Bold", fontSize=13, leading=15, spaceBefore=6, spaceAfter=4, textColor=colors.black, alignment=1))
+        styles.add(ParagraphStyle(name='Label', fontName="DejaVu-Bold", fontSize=10, leading=13, textColor=colors.black, spaceAfter=2))
+        styles.add(ParagraphStyle(name='Body', fontName="DejaVu", fontSize=10, leading=13, textColor=colors.black, spaceAfter=0))
+        _STYLES = styles
+    return _STYLES
+
+def get_page_templates():
+    global _PAGE_TEMPLATES
+    if _PAGE_TEMPLATES is not None:
+        return _PAGE_TEMPLATES
+    register_fonts()
+    if HAS_CRYSTAL_BALL:
+        header_image()  # decode and resample the header image up front
+    frame = Frame(MARGIN, MARGIN, letter[0]-2*MARGIN, letter[1]-2*MARGIN-HEADER_HEIGHT, id='normal')
+    # Page 3: two equal-width frames with 18pt gutter
+    col_width = (letter[0]-2*MARGIN-18)/2
+    frame_left = Frame(MARGIN, MARGIN, col_width, letter[1]-2*MARGIN-HEADER_HEIGHT, id='left')
+    frame_right = Frame(MARGIN+col_width+18, MARGIN, col_width, letter[1]-2*MARGIN-HEADER_HEIGHT, id='right')
+    def on_page(canvas, doc):
+        # Always use the locked header/footer for every page
+        draw_header(canvas, doc, doc.planner_data)
+        draw_footer(canvas, doc, doc.planner_data)
+
+    def on_page3(canvas, doc):
+        # Always use the locked header/footer for every page
+        draw_header(canvas, doc, doc.planner_data)
+        draw_footer(canvas, doc, doc.planner_data)
+        draw_column_divider(canvas, doc)
+    # Every page has its own template (so --profile times each page under its
+    # own id); the evening page's journal rules are the JournalLines flowable.
+    _PAGE_TEMPLATES = [
+        PageTemplate(id='page1', frames=[frame], onPage=on_page),
+        PageTemplate(id='page2', frames=[frame], onPage=on_page),
+        PageTemplate(id='page3', frames=[frame_left, frame_right], onPage=on_page3),
+        PageTemplate(id='page4', frames=[frame], onPage=on_page)
+    ]
+    return _PAGE_TEMPLATES
+
+@lru_cache(maxsize=1)
+def template_fingerprint():
+    """Hash of the template code, fonts, assets and reportlab version (for render caches)."""
+    import reportlab
+    fonts = sorted(glob.glob(os.path.join(FONT_DIR, '*.ttf')))
+    code = [os.path.abspath(__file__), image_assets.__file__, output_profiles.__file__,
+            os.path.join(BASE_DIR, 'page_preview.py'), os.path.join(BASE_DIR, 'day_model.py')]
+    return file_fingerprint(code + fonts + [CRYSTAL_BALL_PATH], extra=reportlab.Version)
+
+def open_render_cache(cache_dir, max_mb=None):
+    max_bytes = int(max_mb * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES
+    return RenderCache(cache_dir, template_fingerprint(), max_bytes)
+
+def _write_pdf(pdf, output_path):
+    if output_path is None:
+        return pdf
+    if hasattr(output_path, 'write'):
+        output_path.write(pdf)
+    else:
+        with open(output_path, 'wb') as f:
+            f.write(pdf)
+
+class ReplayedPage(Flowable):
+    """One page of content drawn by an earlier render, replayed from a PageCache.
+
+    Takes no space: its operators already hold their page positions.
+    """
+    def __init__(self, cached):
+        super().__init__()
+        self.cached = cached
+
+    def wrap(self, availWidth, availHeight):
+        return availWidth, 0
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        for name, (bbox, ops) in self.cached.forms.items():
+            if not canvas.hasForm(name):
+                canvas.beginForm(name, *bbox)
+                canvas._code.extend(ops)
+                canvas.endForm()
+                canvas.__dict__.setdefault('_chrome_forms', {})[name] = (bbox, ops)
+        canvas._code.extend(self.cached.ops)
+        canvas._formsinuse.extend(self.cached.forms_used)
+
+class PlannerDocTemplate(BaseDocTemplate):
+    """BaseDocTemplate that reports page and callback timings to doc.metrics when set.
+
+    With deterministic set (and invariant=1, see make_doc) the file ID is
+    seeded from the output profile and a content hash of every day rendered
+    instead of the clock, so identical input gives identical bytes.
+
+    Finished pages are deflated as soon as they end rather than at save, so a
+    long document holds compressed page streams instead of operator text.
+    Pages after the first of a section (ActionFlowable(('plannerSection',
+    title))) are marked as continued.
+
+    With font_book and page_capture set (see render_pdf's page_cache), the
+    document is encoded with the book and the content of every page drawn
+    after an ActionFlowable(('pageGroup', key)) is collected in
+    page_capture[key] as CachedPage entries.
+
+    With preview set (a width in pixels), page 1 is painted into
+    doc.preview_image as it ends (see page_preview).
+    """
+    metrics = None
+    font_book = None
+    page_capture = None
+    deterministic = False
+    preview = None
+    preview_image = None
+    _capture_key = None
+    _section = None
+
+    def _startBuild(self, filename=None, canvasmaker=None):
+        if canvasmaker is None:
+            super()._startBuild(filename)
+        else:
+            super()._startBuild(filename, canvasmaker)
+        if self.deterministic:
+            self.canv._doc.updateSignature(get_profile().name)
+            self.canv._doc.updateSignature(content_hash(self.planner_data.as_dict()))
+        if self.font_book is not None:
+            self.font_book.seed(self.canv._doc)
+
+    def handle_pageGroup(self, key):
+        # ActionFlowable(('pageGroup', key)): capture the pages that follow under key (None: stop).
+        self._capture_key = key
+        if key is not None:
+            self.page_capture[key] = []
+
+    def handle_pageBegin(self):
+        if self.metrics is None:
+            super().handle_pageBegin()
+        else:
+            self._page_started = (time.perf_counter(), time.process_time(), self.pageTemplate.id)
+            wall0, cpu0 = self._page_started[:2]
+            super().handle_pageBegin()
+            self.metrics.record(f"onPage:{self.pageTemplate.id}", wall0, time.perf_counter() - wall0,
+                                time.process_time() - cpu0, "callback", {"page": self.page})
+        if self.page_capture is not None:
+            # Content starts after the template's onPage chrome.
+            self._content_mark = (len(self.canv._code), len(self.canv._formsinuse))
+
+    def handle_pageEnd(self):
+        if self._capture_key is not None:
+            code_mark, forms_mark = self._content_mark
+            forms_used = self.canv._formsinuse[forms_mark:]
+            chrome = self.canv.__dict__.get('_chrome_forms', {})
+            self.page_capture[self._capture_key].append(CachedPage(
+                self.pageTemplate.id, self.canv._code[code_mark:], forms_used,
+                {name: chrome[name] for name in forms_used if name in chrome}))
+        if self._section is not None and self.page > self._section[1]:
+            draw_continued(self.canv, self, self._section[0])
+        if self.preview and self.page == 1:
+            with self.metrics.stage("preview") if self.metrics else nullcontext():
+                self.preview_image = _paint_preview(self.canv, self.preview)
+        if self.metrics is None:
+            super().handle_pageEnd()
+            self._deflate_page()
+            return
+        page = self.page
+        super().handle_pageEnd()
+        self._deflate_page()
+        # Layout of a page runs from its onPage call to showPage, under the template it started with.
+        wall0, cpu0, template_id = self._page_started
+        self.metrics.record(template_id, wall0, time.perf_counter() - wall0, time.process_time() - cpu0,
+                            "template", {"page": page})
+        self.metrics.count("pages")
+
+    def _deflate_page(self):
+        # The stream is stored pre-filtered; PDFStream.format leaves it alone
+        # once the dictionary names its Filter.
+        page = self.canv._doc.Pages.pages[-1]
+        if not page.compression or rl_config.useA85 or page.Contents or not page.stream:
+            return
+        stream = pdfdoc.PDFStream(content=pdfdoc.PDFZCompress.encode(page.stream))
+        stream.dictionary['Filter'] = pdfdoc.PDFArray([pdfdoc.PDFName(pdfdoc.PDFZCompress.pdfname)])
+        stream.__Comment__ = "page stream"
+        page.Contents = stream
+        page.stream = None
+
+    def handle_plannerSection(self, title):
+        # ActionFlowable(('plannerSection', title)): a page group starts on this page.
+        self._section = (title, self.page)
+
+    def handle_plannerDay(self, day):
+        # ActionFlowable(('plannerDay', day)): header/footer data for the pages that follow.
+        self.planner_data = day
+        if self.deterministic:
+            self.canv._doc.updateSignature(content_hash(day.as_dict()))
+
+    def _endBuild(self):
+        if self.metrics is None and self.font_book is None:
+            return super()._endBuild()
+        # Finish the last page, then serialise (timed on its own).
+        self._doSave = 0
+        super()._endBuild()
+        if self.font_book is not None and not self.font_book.absorb(self.canv._doc):
+            self.page_capture.clear()  # the book was reset: captured codes are stale
+        with self.metrics.stage("serialize") if self.metrics else nullcontext():
+            self.canv.save()
+
+def _paint_preview(canvas, width):
+    import page_preview
+    return page_preview.paint_page(canvas, width, canvas.__dict__.get('_chrome_forms'),
+                                   os.path.join(FONT_DIR, "DejaVuSans.ttf"))
+
+def _preview_format(target):
+    import page_preview
+    return page_preview.preview_format(getattr(target, 'name', target))
+
+def _save_preview(doc, target, fmt):
+    import page_preview
+    page_preview.save_preview(doc.preview_image, target, fmt)
+
+def as_day(data):
+    """The day_model Day for a day document (a Day is returned as is)."""
+    return to_day(data, SCHEMA_PATH)
+
+def day_json(data):
+    """The plain JSON data of a day document or Day, as cache keys hash it."""
+    return data.as_dict() if isinstance(data, Model) else data
+
+def make_doc(target, data, metrics=None, deterministic=False):
+    """Return the planner doc template writing to target (a path or binary file object).
+
+    deterministic fixes the creation dates (reportlab's invariant mode: 2000-01-01,
+    or SOURCE_DATE_EPOCH when set) and derives the file ID from the content.
+    """
+    doc = PlannerDocTemplate(target, pagesize=letter,
+        leftMargin=MARGIN, rightMargin=MARGIN,
+        topMargin=MARGIN, bottomMargin=MARGIN,
+        pageCompression=get_profile().page_compression,
+        invariant=1 if deterministic else None)
+    doc.planner_data = as_day(data)
+    doc.metrics = metrics
+    doc.deterministic = deterministic
+    doc.addPageTemplates(get_page_templates())
+    return doc
+
+# (page, builder, page template, section title)
+PAGE_BUILDERS = [
+    ('page1', iter_page_1_horoscope, 'page1', 'Horoscope'),
+    ('page2', iter_page_2_rituals, 'page2', 'Ritual Kit'),
+    ('page3', iter_page_3_chores_kitchen, 'page3', 'Chores & Kitchen'),
+    ('page4', iter_page_4_evening, 'page4', 'Evening Reflection'),
+]
+
+# Top-level fields each page builder reads. The header (date, moon phase) is
+# drawn by the page templates on every render and is not part of any page.
+PAGE_INPUTS = {
+    'page1': ('day_planet', 'horoscope'),
+    'page2': ('rituals',),
+    'page3': ('chores', 'kitchen'),
+    'page4': ('evening_reflection',),
+}
+
+# Flowables handed to doc.build at a time by the streaming story.
+STORY_CHUNK = 64
+
+# Width in pixels of page-1 previews (a letter page is then 311 px high).
+PREVIEW_WIDTH = 240
+
+def page_inputs(day, page):
+    return {field: day.field_json(field) for field in PAGE_INPUTS[page]}
+
+def iter_story(data, metrics=None, doc=None, page_cache=None):
+    """Return an iterator over the flowables of all four pages for one day.
+
+    Page builders run as the iterator reaches them, so a page's flowables are
+    created while layout consumes them (with metrics, each page is built and
+    timed as a unit instead). With a PageCache (and the doc being built),
+    pages whose inputs are cached are replayed and the others are marked for
+    capture; see render_pdf.
+    """
+    book = page_cache.book(get_profile()) if page_cache is not None else None
+    if book is not None:
+        # Set before doc.build starts: _startBuild seeds the document from the book.
+        doc.font_book = book
+        doc.page_capture = {}
+    return _iter_story(as_day(data), metrics, page_cache, book)
+
+def _iter_story(day, metrics, page_cache, book):
+    styles = get_styles()
+    template = PAGE_BUILDERS[0][2]  # the first page uses the doc's first template
+    first = True
+    for page, builder, page_template, title in PAGE_BUILDERS:
+        # Switch template and break before every page but the first.
+        if page_template != template:
+            yield NextPageTemplate(page_template)
+            template = page_template
+        if not first:
+            yield PageBreak()
+        first = False
+        yield ActionFlowable(('plannerSection', title))
+        if book is not None:
+            key = page_cache.key(page, page_inputs(day, page), book)
+            cached = page_cache.get(key)
+            if cached is not None:
+                yield ActionFlowable(('pageGroup', None))
+                for i, content in enumerate(cached):
+                    if i:
+                        yield PageBreak()
+                    yield ReplayedPage(content)
+                if metrics is not None:
+                    metrics.count("pages_replayed", len(cached))
+                continue
+            yield ActionFlowable(('pageGroup', key))
+        if metrics is None:
+            yield from builder(day, styles)
+            continue
+        with metrics.stage(f"story:{page}"):
+            flowables = list(builder(day, styles))
+        metrics.count(f"flowables:{page}", len(flowables))
+        yield from flowables
+
+def build_story(data, metrics=None, doc=None, page_cache=None):
+    """Return the flowables of all four pages for one day as a list."""
+    return list(iter_story(data, metrics, doc, page_cache))
+
+def _chunked(flowables, size=STORY_CHUNK):
+    flowables = iter(flowables)
+    while True:
+        chunk = list(islice(flowables, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _store_pages(doc, page_cache):
+    for key, pages in doc.page_capture.items():
+        page_cache.put(key, pages)
+
+def _profile_applied(profile):
+    register_fonts()  # the profile sets subsetting on the registered faces
+    return output_profiles.applied(profile, PLANNER_FONTS)
+
+def render_pdf(data, output_path=None, date_override=None, cache=None, metrics=None, profile=None,
+               page_cache=None, deterministic=False, preview=None, preview_format=None):
+    """Render one day to output_path (a path or a writable binary file object).
+
+    With no output_path the PDF is rendered in memory and returned as bytes.
+    The story is streamed: lists of any length are laid out without holding
+    their flowables all at once, and overflow runs onto continuation pages.
+    With a RenderCache, identical inputs are served from the cache without
+    laying the document out again. With a PageCache, only the pages whose
+    inputs (PAGE_INPUTS) changed since an earlier render are laid out; the
+    others are replayed from the cache. With a RenderMetrics, stage, page and
+    callback timings and flowable/page/byte counts are recorded into it.
+    profile names one of output_profiles.PROFILES (default: balanced).
+    With deterministic, the same data and profile always give the same bytes
+    (see make_doc). The page cache is not used then: its shared font
+    numbering depends on what was rendered before.
+    With preview (a path or binary file object), a PREVIEW_WIDTH pixel image
+    of page 1 is painted during the same build and written there, as
+    preview_format ('PNG' or 'WEBP'; by default from the file extension,
+    else PNG). A RenderCache keeps it next to the PDF.
+    """
+    profile = get_profile(profile)
+    if deterministic:
+        page_cache = None
+    if preview is not None and preview_format is None:
+        preview_format = _preview_format(preview)
+    if cache is not None:
+        key = cache.key(day_json(data), date_override, profile.name, deterministic)
+        with metrics.stage("cache_lookup") if metrics else nullcontext():
+            pdf = cache.get(key)
+            image = cache.get(key, preview_format.lower()) if preview is not None and pdf is not None else None
+        if pdf is None or (preview is not None and image is None):
+            image_buffer = BytesIO() if preview is not None else None
+            rendered = render_pdf(data, None, date_override, metrics=metrics, profile=profile, page_cache=page_cache,
+                                  deterministic=deterministic, preview=image_buffer, preview_format=preview_format)
+            if pdf is None:  # else only the preview was missing: keep serving the cached PDF
+                pdf = rendered
+                cache.put(key, pdf)
+            if image_buffer is not None:
+                image = image_buffer.getvalue()
+                cache.put(key, image, preview_format.lower())
+        else:
+            reset_glyph_usage()
+        if preview is not None:
+            _write_pdf(image, preview)
+        return _write_pdf(pdf, output_path)
+    data = as_day(data)
+    with _profile_applied(profile):
+        if metrics is not None:
+            return _render_pdf_profiled(data, output_path, metrics, page_cache, deterministic, preview, preview_format)
+        buffer = BytesIO() if output_path is None else None
+        doc = make_doc(output_path if buffer is None else buffer, data, deterministic=deterministic)
+        if preview is not None:
+            doc.preview = PREVIEW_WIDTH
+        story = _StoryStream(_chunked(iter_story(data, doc=doc, page_cache=page_cache)))
+        reset_glyph_usage()
+        doc.build(story)
+        if page_cache is not None:
+            _store_pages(doc, page_cache)
+    if preview is not None:
+        _save_preview(doc, preview, preview_format)
+    if buffer is not None:
+        return buffer.getvalue()
+
+def compare_profiles(data, runs=3):
+    """Render data under every output profile; returns [(name, output bytes, best ms)]."""
+    rows = []
+    for name in PROFILES:
+        render_pdf(data, profile=name)  # warm-up: image resampling, font subsets
+        best = None
+        for _ in range(runs):
+            started = time.perf_counter()
+            pdf = render_pdf(data, profile=name)
+            elapsed = (time.perf_counter() - started) * 1000.0
+            best = elapsed if best is None else min(best, elapsed)
+        rows.append((name, len(pdf), best))
+    return rows
+
+def _render_pdf_profiled(data, output_path, metrics, page_cache=None, deterministic=False, preview=None,
+                         preview_format=None):
+    # Always renders to memory so the file write is timed as its own stage.
+    buffer = BytesIO()
+    doc = make_doc(buffer, data, metrics, deterministic)
+    if preview is not None:
+        doc.preview = PREVIEW_WIDTH
+    with metrics.stage("story"):
+        story = build_story(data, metrics, doc, page_cache)
+    metrics.count("flowables", len(story))
+    reset_glyph_usage()
+    with metrics.stage("build"):
+        doc.build(story)
+    if page_cache is not None:
+        _store_pages(doc, page_cache)
+    if preview is not None:
+        with metrics.stage("preview_encode"):
+            _save_preview(doc, preview, preview_format)
+    pdf = buffer.getvalue()
+    metrics.count("output_bytes", len(pdf))
+    if output_path is None:
+        return pdf
+    with metrics.stage("write"):
+        _write_pdf(pdf, output_path)
+
+class _StoryStream(list):
+    """Story list that refills itself from an iterator of flowable lists.
+
+    doc.build checks len() before every flowable and only works at the front
+    of the list, so only the chunk being laid out is held in memory.
+    """
+    def __init__(self, chunks):
+        super().__init__()
+        self._chunks = iter(chunks)
+
+    def __len__(self):
+        while not super().__len__():
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self.extend(chunk)
+        return super().__len__()
+
+def _iter_volume_stories(first, days):
+    yield from _chunked(iter_story(first))
+    for data in days:
+        day = as_day(data)
+        # Switch the header data at the end of the previous day, so the
+        # page break below opens this day's first page with it.
+        yield [ActionFlowable(('plannerDay', day)), NextPageTemplate('page1'), PageBreak()]
+        yield from _chunked(iter_story(day))
+
+def render_volume(days, output_path=None, profile=None, deterministic=False):
+    """Render an iterable of day documents into one PDF (a week or month bundle).
+
+    Every day gets its usual four pages and its own header. Fonts, the header
+    image and the page chrome are embedded once for the whole volume. Day
+    stories are built only as layout reaches them. Finished pages are kept
+    deflated until the file is written, so memory grows with the compressed
+    page count but not with the flowables of past days.
+    With no output_path the PDF is returned as bytes. With deterministic the
+    file ID comes from the days' content (see make_doc).
+    """
+    days = iter(days)
+    first = next(days, None)
+    if first is None:
+        raise ValueError("volume has no day documents")
+    first = as_day(first)
+    buffer = BytesIO() if output_path is None else None
+    with _profile_applied(profile):
+        doc = make_doc(output_path if buffer is None else buffer, first, deterministic=deterministic)
+        reset_glyph_usage()
+        doc.build(_StoryStream(_iter_volume_stories(first, days)))
+    if buffer is not None:
+        return buffer.getvalue()
+
+def format_glyph_usage(usage):
+    return ", ".join(f"{name}={drawn}/{embedded}" for name, (drawn, embedded) in sorted(usage.items())) or "none"
+
+# --- BATCH RENDERING ---
+def iter_day_documents(source):
+    """Yield (name, data, error) for every day document in a batch source.
+
+    source is a directory of .json files, a glob pattern, a .jsonl/.ndjson file,
+    or '-' for JSONL on stdin. Unreadable records are yielded with an error
+    message instead of stopping the batch.
+    """
+    if source == '-':
+        yield from _iter_jsonl(sys.stdin, 'stdin')
+        return
+    if source.endswith(('.jsonl', '.ndjson')) and os.path.isfile(source):
+        stem = os.path.splitext(os.path.basename(source))[0]
+        with open(source, 'r', encoding='utf-8') as f:
+            yield from _iter_jsonl(f, stem)
+        return
+    if os.path.isdir(source):
+        paths = sorted(glob.glob(os.path.join(source, '*.json')))
+    else:
+        paths = sorted(glob.glob(source))
+    if not paths:
+        yield source, None, "no input documents found"
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                yield name, json.load(f), None
+        except Exception as e:
+            yield name, None, f"failed to read JSON file: {e}"
+
+def _iter_jsonl(stream, stem):
+    for lineno, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        name = f"{stem}-{lineno}"
+        try:
+            yield name, json.loads(line), None
+        except ValueError as e:
+            yield name, None, f"invalid JSON on line {lineno}: {e}"
+
+# Outcome of one batch record; glyphs maps each embedded font to
+# (glyphs drawn, glyphs embedded) and cached is True when the render cache
+# served everything asked for (a cached PDF whose preview had to be painted
+# again is not cached).
+# For archive renders, output_path is the archive key and pdf/source hold the
+# bytes to append.
+RenderResult = namedtuple('RenderResult', 'name output_path elapsed_ms error glyphs cached pdf source',
+                          defaults=(None, None))
+
+def render_record(name, data, error, out_dir, schema, date_override=None, cache=None, profile=None,
+                  deterministic=False, preview_format=None, archive_user=None, archive_source=False):
+    """Validate and render one batch record into out_dir; returns a RenderResult.
+
+    With preview_format ('PNG' or 'WEBP'), a page-1 preview is written next to the PDF.
+    With archive_user, the PDF (and with archive_source its JSON) is returned in the
+    result for a PlannerArchive, keyed by user, date and record name, instead of being written.
+    """
+    started = time.perf_counter()
+    output_path = None
+    glyphs = {}
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    if error is None:
+        day, problems = build_day(data, schema)
+        if problems:
+            error = "validation failed: " + "; ".join(map(str, problems))
+    pdf = source = None
+    if error is None:
+        output_path = os.path.join(out_dir, f"{name}.pdf")
+        preview = os.path.join(out_dir, f"{name}.{preview_format.lower()}") if preview_format else None
+        try:
+            if archive_user is None:
+                render_pdf(day, output_path, date_override, cache, profile=profile, deterministic=deterministic,
+                           preview=preview, preview_format=preview_format)
+            else:
+                from planner_archive import archive_key
+                output_path = archive_key(archive_user, data, date_override, name)
+                pdf = render_pdf(day, None, date_override, cache, profile=profile, deterministic=deterministic,
+                                 preview=preview, preview_format=preview_format)
+                if archive_source:
+                    source = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            glyphs = glyph_usage()
+        except Exception as e:
+            error = f"render failed: {e}"
+            output_path = pdf = source = None
+    cached = cache is not None and cache.hits > hits and cache.misses == misses
+    return RenderResult(name, output_path, (time.perf_counter() - started) * 1000.0, error, glyphs, cached,
+                        pdf, source)
+
+# Per-process state for --workers; filled in once by _init_worker.
+_WORKER_SCHEMA = None
+_WORKER_CACHE = None
+_WORKER_PROFILE = None
+_WORKER_DETERMINISTIC = False
+_WORKER_PREVIEW = None
+_WORKER_ARCHIVE = (None, False)
+
+def _init_worker(schema_path, cache_dir=None, cache_max_mb=None, profile=None, deterministic=False,
+                 preview_format=None, archive_user=None, archive_source=False):
+    global _WORKER_SCHEMA, _WORKER_CACHE, _WORKER_PROFILE, _WORKER_DETERMINISTIC, _WORKER_PREVIEW, _WORKER_ARCHIVE
+    _WORKER_SCHEMA = load_schema(schema_path)
+    _WORKER_PROFILE = profile
+    _WORKER_DETERMINISTIC = deterministic
+    _WORKER_PREVIEW = preview_format
+    _WORKER_ARCHIVE = (archive_user, archive_source)
+    if cache_dir:
+        _WORKER_CACHE = open_render_cache(cache_dir, cache_max_mb)
+    # Register the fonts (lazy, on first use) and warm the shared styles/templates.
+    get_styles()
+    get_page_templates()
+
+def _render_in_worker(name, data, error, out_dir, date_override):
+    return render_record(name, data, error, out_dir, _WORKER_SCHEMA, date_override, _WORKER_CACHE, _WORKER_PROFILE,
+                         _WORKER_DETERMINISTIC, _WORKER_PREVIEW, *_WORKER_ARCHIVE)
+
+def render_batch(source, out_dir, date_override=None, schema_path=None, workers=1, font_report=False,
+                 cache_dir=None, cache_max_mb=None, profile=None, deterministic=False, preview_format=None,
+                 archive=None, archive_user=None, archive_source=False):
+    """Render every record from source into out_dir; returns the number of failures.
+
+    With workers > 1 the records are spread over a process pool; results are
+    still reported in input order. With cache_dir, identical documents are
+    served from a shared render cache. With preview_format, each PDF gets a
+    page-1 preview image beside it. With archive (a directory), the PDFs are
+    appended to that PlannerArchive under <archive_user>/<date>/<name> instead,
+    with their source JSON when archive_source is set. A record whose key another
+    record of the same batch already took fails instead of replacing it.
+    """
+    schema_path = schema_path or SCHEMA_PATH
+    packed = None
+    if archive is not None:
+        from planner_archive import PlannerArchive, DEFAULT_USER
+        packed = PlannerArchive(archive)
+        archive_user = archive_user or DEFAULT_USER
+    else:
+        archive_user = None
+    if packed is None or preview_format:
+        os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    rendered = from_cache = 0
+    failures = []
+    archived = {}  # archive key -> name of the record stored under it
+    records = iter_day_documents(source)
+    if workers > 1:
+        from planner_pool import make_pool, ordered_map
+        pool = make_pool(workers, _init_worker, (schema_path, cache_dir, cache_max_mb, profile, deterministic,
+                                                    preview_format, archive_user, archive_source))
+        jobs = ((name, data, error, out_dir, date_override) for name, data, error in records)
+        results = ordered_map(pool, _render_in_worker, jobs, window=workers * 4)
+    else:
+        pool = None
+        schema = load_schema(schema_path)
+        cache = open_render_cache(cache_dir, cache_max_mb) if cache_dir else None
+        results = (render_record(name, data, error, out_dir, schema, date_override, cache, profile, deterministic,
+                                 preview_format, archive_user, archive_source)
+                   for name, data, error in records)
+    try:
+        for result in results:
+            if packed is not None and result.output_path in archived:
+                result = result._replace(error=f"archive key {result.output_path} already used by "
+                                               f"{archived[result.output_path]} in this batch")
+            if result.error:
+                failures.append((result.name, result.error))
+                print(f"[ERROR] {result.name}: {result.error} ({result.elapsed_ms:.1f} ms)")
+            else:
+                rendered += 1
+                from_cache += result.cached
+                source_note = ", cached" if result.cached else ""
+                target = result.output_path
+                if packed is not None:
+                    packed.append(result.output_path, result.pdf, result.source)
+                    archived[result.output_path] = result.name
+                    target = f"{archive}:{result.output_path}"
+                print(f"[OK] {result.name} -> {target} ({result.elapsed_ms:.1f} ms{source_note})")
+                if font_report:
+                    print(f"  glyphs drawn/embedded: {format_glyph_usage(result.glyphs)}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if packed is not None:
+            packed.close()
+    total = time.perf_counter() - started
+    cache_note = f" ({from_cache} from cache)" if cache_dir else ""
+    print(f"Batch complete: {rendered} rendered{cache_note}, {len(failures)} failed in {total:.2f}s")
+    if failures:
+        print("Failed documents:")
+        for name, error in failures:
+            print(f"- {name}: {error}")
+    return len(failures)
+
+def render_volume_batch(source, output_path, schema_path=None, font_report=False, profile=None, deterministic=False):
+    """Render every valid record from source into one volume PDF; returns the number of failures.
+
+    Invalid records are reported and left out of the volume.
+    """
+    schema = load_schema(schema_path or SCHEMA_PATH)
+    started = time.perf_counter()
+    failures = []
+    included = []
+
+    def valid_days():
+        for name, data, error in iter_day_documents(source):
+            if error is None:
+                day, problems = build_day(data, schema)
+                if problems:
+                    error = "validation failed: " + "; ".join(map(str, problems))
+            if error:
+                failures.append((name, error))
+                print(f"[ERROR] {name}: {error}")
+                continue
+            included.append(name)
+            yield day
+    out_dir = os.path.dirname(output_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    try:
+        render_volume(valid_days(), output_path, profile, deterministic)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return len(failures) or 1
+    total = time.perf_counter() - started
+    print(f"Volume complete: {len(included)} days -> {output_path}, {len(failures)} failed in {total:.2f}s")
+    if font_report:
+        print(f"Glyphs drawn/embedded: {format_glyph_usage(glyph_usage())}")
+    return len(failures)
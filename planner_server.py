@@ -0,0 +1,266 @@
+"""
+Local render service for Astro Planner PDFs.
+
+Keeps a pool of warm render processes (fonts, styles and page templates
+loaded once) and serves planners over HTTP:
+
+    POST /render[?date=...]   day JSON in the body -> application/pdf
+    POST /preview[?date=...&format=png|webp]
+                              day JSON in the body -> a small image of page 1
+    GET  /healthz             pool and queue status as JSON
+
+At most --workers renders run at once and at most --queue more wait for a
+free worker; further requests are rejected with 503 instead of piling up.
+A render that runs past --timeout has its worker killed and replaced before
+the request is answered 504, so the queue limit bounds the real load.
+With --cache-dir, repeated documents are answered from the render cache
+without touching the pool. Each worker also keeps the pages it drew in a
+page cache (--page-cache), so re-rendering an edited day only lays out the
+pages whose fields changed. A preview is painted during the PDF build, and
+with a render cache the PDF and its preview are stored together.
+
+With --deterministic, identical requests get byte-identical PDFs and an ETag
+naming the input, profile and template; a request whose If-None-Match holds
+that tag is answered 304 without rendering.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MAX_BODY_BYTES = 1024 * 1024
+DEFAULT_PAGE_CACHE = 256
+CONTENT_TYPES = {"pdf": "application/pdf", "png": "image/png", "webp": "image/webp"}
+
+# The worker's PageCache (None when disabled).
+_page_cache = None
+
+
+def _init_worker(page_cache_size=0):
+    global _page_cache
+    import planner_render
+    planner_render.get_styles()
+    planner_render.get_page_templates()
+    if page_cache_size:
+        from page_cache import PageCache
+        _page_cache = PageCache(page_cache_size)
+
+
+def _render(data, date_override, profile, deterministic=False, preview_format=None):
+    # Returns the PDF bytes, or (PDF, preview) bytes with preview_format.
+    from planner_render import render_pdf
+    if preview_format is None:
+        return render_pdf(data, None, date_override, profile=profile, page_cache=_page_cache,
+                          deterministic=deterministic)
+    from io import BytesIO
+    preview = BytesIO()
+    pdf = render_pdf(data, None, date_override, profile=profile, page_cache=_page_cache, deterministic=deterministic,
+                     preview=preview, preview_format=preview_format)
+    return pdf, preview.getvalue()
+
+
+def _etag_matches(if_none_match, etag):
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in tags or "*" in tags
+
+
+class RenderService:
+    def __init__(self, workers, queue_size, timeout, schema_path, cache_dir=None, cache_max_mb=None, profile='balanced',
+                 page_cache=DEFAULT_PAGE_CACHE, deterministic=False):
+        from planner_pool import WorkerPool
+        from validate_json import read_schema, get_validator
+        self.schema = read_schema(schema_path)
+        get_validator(self.schema)
+        self.pool = WorkerPool(workers, _init_worker, (page_cache,))
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.timeout = timeout
+        self.workers = workers
+        self.queue_size = queue_size
+        self.profile = profile
+        self.deterministic = deterministic
+        self.fingerprint = None
+        if deterministic:
+            from planner_render import template_fingerprint
+            self.fingerprint = template_fingerprint()
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.rendered = 0
+        self.rejected = 0
+        self.cache = None
+        if cache_dir:
+            from planner_render import open_render_cache
+            self.cache = open_render_cache(cache_dir, cache_max_mb)
+
+    def status(self):
+        with self.lock:
+            status = {"status": "ok", "workers": self.workers, "queue": self.queue_size, "profile": self.profile,
+                      "deterministic": self.deterministic, "in_flight": self.in_flight, "rendered": self.rendered, "rejected": self.rejected}
+            if self.cache is not None:
+                status["cache"] = self.cache.stats()
+            return status
+
+    def render(self, data, date_override=None, if_none_match=None, preview_format=None):
+        """Return (http status, content type, body, extra headers) for one render request.
+
+        With preview_format ('PNG' or 'WEBP') the body is the page-1 preview instead of the PDF.
+        """
+        from validate_json import check_json
+        errors = check_json(data, self.schema)
+        if errors:
+            body = {"error": "validation failed", "details": [e._asdict() for e in errors]}
+            return 400, "application/json", json.dumps(body).encode("utf-8"), None
+        ext = preview_format.lower() if preview_format else "pdf"
+        content_type = CONTENT_TYPES[ext]
+        headers = None
+        if self.deterministic:
+            from render_cache import render_key
+            key = render_key(data, date_override, self.profile, True, self.fingerprint)
+            etag = f'"{key}"' if ext == "pdf" else f'"{key}.{ext}"'
+            headers = {"ETag": etag}
+            if if_none_match and _etag_matches(if_none_match, etag):
+                return 304, content_type, b"", headers
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(data, date_override, self.profile, self.deterministic)
+            body = self.cache.get(key, ext)
+            if body is not None:
+                return 200, content_type, body, headers
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            return 503, "application/json", b'{"error": "render queue full"}', {"Retry-After": "1"}
+        with self.lock:
+            self.in_flight += 1
+        try:
+            # Holds the slot until the render is done or its worker has been killed.
+            result = self.pool.call(_render, data, date_override, self.profile, self.deterministic, preview_format,
+                                    timeout=self.timeout)
+        except TimeoutError:
+            return 504, "application/json", b'{"error": "render timed out"}', None
+        except Exception as e:
+            return 500, "application/json", json.dumps({"error": f"render failed: {e}"}).encode("utf-8"), None
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            self.slots.release()
+        pdf, preview = (result, None) if preview_format is None else result
+        with self.lock:
+            self.rendered += 1
+        if key is not None:
+            self.cache.put(key, pdf)
+            if preview is not None:
+                self.cache.put(key, preview, ext)
+        return 200, content_type, pdf if preview is None else preview, headers
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    service = None  # set by serve()
+
+    def _send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/healthz":
+            self._send(200, "application/json", json.dumps(self.service.status()).encode("utf-8"))
+        else:
+            self._send(404, "application/json", b'{"error": "not found"}')
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path not in ("/render", "/preview"):
+            self._send(404, "application/json", b'{"error": "not found"}')
+            return
+        query = parse_qs(url.query)
+        preview_format = None
+        if url.path == "/preview":
+            preview_format = query.get("format", ["png"])[0].upper()
+            if preview_format not in ("PNG", "WEBP"):
+                self._send(400, "application/json", b'{"error": "format must be png or webp"}')
+                return
+        if self.headers.get("Content-Length") is None:
+            self._send(411, "application/json", b'{"error": "Content-Length required"}')
+            return
+        try:
+            length = int(self.headers["Content-Length"])
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            self._send(400, "application/json", b'{"error": "invalid Content-Length"}')
+            return
+        if length > MAX_BODY_BYTES:
+            self._send(413, "application/json", b'{"error": "request body too large"}')
+            return
+        try:
+            data = json.loads(self.rfile.read(length) or b"null")
+        except ValueError as e:
+            self._send(400, "application/json", json.dumps({"error": f"invalid JSON: {e}"}).encode("utf-8"))
+            return
+        date_override = query.get("date", [None])[0]
+        status, content_type, body, headers = self.service.render(data, date_override, self.headers.get("If-None-Match"),
+                                                                  preview_format)
+        self._send(status, content_type, body, headers)
+
+    def log_message(self, format, *args):
+        sys.stderr.write(f"[{self.log_date_time_string()}] {format % args}\n")
+
+
+def serve(host, port, workers, queue_size, timeout, schema_path, cache_dir=None, cache_max_mb=None, profile='balanced',
+          page_cache=DEFAULT_PAGE_CACHE, deterministic=False):
+    service = RenderService(workers, queue_size, timeout, schema_path, cache_dir, cache_max_mb, profile, page_cache,
+                            deterministic)
+    RenderHandler.service = service
+    server = ThreadingHTTPServer((host, port), RenderHandler)
+    server.daemon_threads = True
+    print(f"Planner render server on http://{host}:{port} ({workers} workers, queue {queue_size}, {profile} output)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Astro Planner local PDF render server")
+    parser.add_argument('--host', default='127.0.0.1', help='Address to bind (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    parser.add_argument('--workers', type=int, default=2, help='Warm render processes (default: 2)')
+    parser.add_argument('--queue', type=int, default=8, help='Requests allowed to wait for a worker before 503 (default: 8)')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='Seconds a render may run before its worker is recycled and the request gets 504 (default: 30)')
+    parser.add_argument('--schema', default=None, help='Schema JSON (default: schema.json next to the generator)')
+    parser.add_argument('--cache-dir', help='Serve repeated documents from this render cache directory')
+    parser.add_argument('--cache-max-mb', type=float, help='Render cache size budget in MB (default: 512)')
+    parser.add_argument('--output-profile', choices=('fast', 'balanced', 'smallest'), default='balanced',
+                        help='PDF compression profile; fast suits on-demand downloads (default: balanced)')
+    parser.add_argument('--page-cache', type=int, default=DEFAULT_PAGE_CACHE,
+                        help=f'Page groups each worker keeps for re-rendering edited days; 0 disables (default: {DEFAULT_PAGE_CACHE})')
+    parser.add_argument('--deterministic', action='store_true',
+                        help='Byte-identical PDFs for identical requests, with ETag/If-None-Match support')
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    schema_path = args.schema
+    if schema_path is None:
+        schema_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.json')
+    serve(args.host, args.port, args.workers, args.queue, args.timeout, schema_path, args.cache_dir, args.cache_max_mb,
+          args.output_profile, args.page_cache, args.deterministic)
+
+
+if __name__ == "__main__":
+    main()
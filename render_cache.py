@@ -0,0 +1,146 @@
+"""
+Content-addressed on-disk cache of rendered planner PDFs.
+
+Entries are keyed by a SHA-256 over the canonical JSON of the day document,
+the header date override, the output profile, whether the render was
+deterministic and a fingerprint of the template code, fonts and assets, so
+identical inputs rendered by the same template share one file. A page
+preview of an entry is kept next to it under the same key (<key>.png or
+<key>.webp) and shares the byte budget.
+The directory is kept under a byte budget by evicting the least recently
+used entries (file mtime is bumped on every hit).
+One RenderCache can be shared by threads: only the counters are updated
+under its lock, and one thread at a time evicts.
+"""
+import hashlib
+import json
+import os
+import threading
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+EXTENSIONS = (".pdf", ".png", ".webp")
+
+
+def file_fingerprint(paths, extra=""):
+    """SHA-256 over the contents of paths (in the given order) plus an extra string."""
+    digest = hashlib.sha256(extra.encode("utf-8"))
+    for path in paths:
+        digest.update(os.path.basename(path).encode("utf-8"))
+        try:
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        except OSError:
+            digest.update(b"<missing>")
+    return digest.hexdigest()
+
+
+def content_hash(data):
+    """SHA-256 (hex) over the canonical JSON of a day document."""
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def render_key(data, date_override, profile, deterministic, fingerprint):
+    """SHA-256 naming one render: for deterministic renders, the same key means the same bytes."""
+    canonical = json.dumps({"data": data, "date": date_override, "profile": profile, "deterministic": bool(deterministic),
+                            "template": fingerprint}, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, cache_dir, fingerprint, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.fingerprint = fingerprint
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def key(self, data, date_override=None, profile=None, deterministic=False):
+        return render_key(data, date_override, profile, deterministic, self.fingerprint)
+
+    def _path(self, key, ext="pdf"):
+        return os.path.join(self.cache_dir, f"{key}.{ext}")
+
+    def get(self, key, ext="pdf"):
+        """Return the cached PDF (or with ext, preview) bytes for key, or None on a miss."""
+        path = self._path(key, ext)
+        try:
+            with open(path, "rb") as f:
+                pdf = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return pdf
+
+    def put(self, key, pdf, ext="pdf"):
+        path = self._path(key, ext)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            replaced = os.path.getsize(path)  # rewritten (e.g. rendered again for a missing preview)
+        except OSError:
+            replaced = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(pdf)
+            os.replace(tmp_path, path)
+        except OSError:
+            return  # a full or read-only cache must not fail the render
+        with self._lock:
+            self._size += len(pdf) - replaced
+            over = self._size > self.max_bytes
+        # Skipped while another thread evicts; it rescans the directory anyway.
+        if over and self._evict_lock.acquire(blocking=False):
+            try:
+                self._evict()
+            finally:
+                self._evict_lock.release()
+
+    def _entries(self):
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith(EXTENSIONS):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue  # evicted by another process
+            entries.append((name, st.st_size, st.st_mtime))
+        return entries
+
+    def _evict(self):
+        # Rescan so entries written by other processes are counted, then drop
+        # the least recently used down to 90% of the budget.
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = evictions = 0
+        for name, entry_size, _ in entries:
+            if size - removed <= target:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            removed += entry_size
+            evictions += 1
+        with self._lock:
+            self._size = size - removed
+            self.evictions += evictions
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "bytes": self._size}
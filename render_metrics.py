@@ -0,0 +1,92 @@
+"""
+Opt-in timing instrumentation for planner renders.
+
+A RenderMetrics object is passed to render_pdf (or filled in by the CLI's
+--profile flags) and records wall and CPU time for each pipeline stage, each
+page laid out (by page template) and each onPage callback, plus counters such
+as flowables per page builder, pages and output bytes. The events can be
+printed as a report or written as Chrome-trace JSON (chrome://tracing,
+Perfetto).
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RenderMetrics:
+    def __init__(self, listener=None):
+        # listener(name, category, wall_s, cpu_s, args) is called for every event,
+        # e.g. to forward timings to a job log.
+        self.listener = listener
+        self.events = []
+        self.counters = {}
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, category="stage", **args):
+        wall0 = time.perf_counter()
+        cpu0 = time.process_time()
+        try:
+            yield
+        finally:
+            self.record(name, wall0, time.perf_counter() - wall0, time.process_time() - cpu0, category, args)
+
+    def record(self, name, start, wall, cpu, category="stage", args=None):
+        """Record one event; start is a time.perf_counter() value."""
+        self.events.append((name, category, start - self._origin, wall, cpu, args or {}))
+        if self.listener is not None:
+            self.listener(name, category, wall, cpu, args or {})
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def totals(self, category):
+        """Return {name: {"calls", "wall_ms", "cpu_ms"}} summed over events of category."""
+        totals = {}
+        for name, cat, _, wall, cpu, _ in self.events:
+            if cat != category:
+                continue
+            entry = totals.setdefault(name, {"calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0})
+            entry["calls"] += 1
+            entry["wall_ms"] += wall * 1000.0
+            entry["cpu_ms"] += cpu * 1000.0
+        return totals
+
+    def summary(self):
+        return {
+            "stages": self.totals("stage"),
+            "templates": self.totals("template"),
+            "callbacks": self.totals("callback"),
+            "counters": dict(self.counters),
+        }
+
+    def format_report(self):
+        summary = self.summary()
+        lines = []
+        for title, key in (("Stages", "stages"), ("Pages by template", "templates"), ("Page callbacks", "callbacks")):
+            if not summary[key]:
+                continue
+            lines.append(f"{title}:")
+            for name, entry in summary[key].items():
+                lines.append(f"  {name:28} {entry['wall_ms']:9.2f} ms wall {entry['cpu_ms']:9.2f} ms cpu  x{entry['calls']}")
+        if summary["counters"]:
+            lines.append("Counters:")
+            for name, value in sorted(summary["counters"].items()):
+                lines.append(f"  {name:28} {value}")
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        """Return the events in Chrome trace-event format (complete 'X' events, microseconds)."""
+        pid = os.getpid()
+        tid = threading.get_ident()
+        events = [{"name": name, "cat": category, "ph": "X", "ts": start * 1e6, "dur": wall * 1e6,
+                   "pid": pid, "tid": tid, "args": dict(args, cpu_ms=cpu * 1000.0)}
+                  for name, category, start, wall, cpu, args in self.events]
+        events.append({"name": "counters", "ph": "C", "ts": 0, "pid": pid, "tid": tid, "args": dict(self.counters)})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
@@ -1,67 +1,219 @@
 import sys
+import argparse
 import json
 import re
 
+# Every section header, recognised in a single scan over the text.
+_SECTION_RE = re.compile(r"Date:|Ritual Kit:|Upcoming Events \(You-Only\):|Housewitch Chore of the Day:|Kitchen Witch Tip:|Creative Flow of the Day:")
+# Field layout of each section, matched anchored at its header; the first
+# header whose fields match wins, as with a re.search over the whole text.
+_SECTION_PATTERNS = {
+    "Date:": re.compile(r"Date:\s*(.+)\nMoon Phase & Sign:\s*(.+)\nDay Planet:\s*(.+)"),
+    "Ritual Kit:": re.compile(r"Ritual Kit:\s*Candle:\s*(.+)\nOil:\s*(.+)\nCrystal:\s*(.+)\nHerb:\s*(.+)\nMini Ritual:\s*(.+)"),
+    "Upcoming Events (You-Only):": re.compile(r"Upcoming Events \(You-Only\):\s*Transit Notes:\s*(.+)\nReflection:\s*(.+)"),
+    "Kitchen Witch Tip:": re.compile(r"Kitchen Witch Tip:\s*Idea:\s*(.+)\nIngredient:\s*(.+)\nTreat:\s*(.+)\nNotes:\s*(.*)"),
+    "Creative Flow of the Day:": re.compile(r"Creative Flow of the Day:\s*Project:\s*(.+)\nMode:\s*(.+)\nTime Box:\s*(.+)\nBonus:\s*(.+)"),
+}
+# (result key, field keys) per header, in the order keys appear in the output.
+# A result key of None puts the fields at the top level.
+_SECTION_FIELDS = [
+    ("Date:", None, ("date", "moon_phase_sign", "day_planet")),
+    ("Ritual Kit:", "ritual_kit", ("candle", "oil", "crystal", "herb", "mini_ritual")),
+    ("Upcoming Events (You-Only):", "upcoming_events", ("transit_notes", "reflection")),
+    ("Housewitch Chore of the Day:", "housewitch_chore", None),
+    ("Kitchen Witch Tip:", "kitchen_witch", ("idea", "ingredient", "treat", "notes")),
+    ("Creative Flow of the Day:", "creative_flow", ("project", "mode", "time_box", "bonus")),
+]
+_CHORE_HEADER = "Housewitch Chore of the Day:"
+_CHORE_END = "Kitchen Witch Tip:"
+_CHORE_LINE_RE = re.compile(r"\[(.+?)\]\s*(.+)")
+_LEADING_SPACE_RE = re.compile(r"\s*")
+
+def _parse_chores(text, pos):
+    # The chore block runs from its header to the next "Kitchen Witch Tip:" (or the end).
+    pos = _LEADING_SPACE_RE.match(text, pos).end()
+    end = text.find(_CHORE_END, pos)
+    block = text[pos:] if end < 0 else text[pos:end]
+    chores = []
+    for line in block.split('\n'):
+        if line.strip() and line.strip().startswith('['):
+            m = _CHORE_LINE_RE.match(line)
+            if m:
+                chores.append({"tag": m.group(1).strip(), "task": m.group(2).strip()})
+    return chores
+
 def parse_text(text):
-    # Simple regex-based parser for the expected daily check-in format
+    # Single scan over the section headers; each section is parsed where its
+    # header occurs, so the input is never re-scanned from the start.
+    found = {}
+    for token in _SECTION_RE.finditer(text):
+        header = token.group(0)
+        if header in found:
+            continue
+        if header == _CHORE_HEADER:
+            found[header] = _parse_chores(text, token.end())
+            continue
+        m = _SECTION_PATTERNS[header].match(text, token.start())
+        if m:
+            found[header] = [value.strip() for value in m.groups()]
     result = {}
-    # Header
-    header = re.search(r"Date:\s*(.+)\nMoon Phase & Sign:\s*(.+)\nDay Planet:\s*(.+)", text)
-    if header:
-        result["date"] = header.group(1).strip()
-        result["moon_phase_sign"] = header.group(2).strip()
-        result["day_planet"] = header.group(3).strip()
-    # Ritual Kit
-    ritual = re.search(r"Ritual Kit:\s*Candle:\s*(.+)\nOil:\s*(.+)\nCrystal:\s*(.+)\nHerb:\s*(.+)\nMini Ritual:\s*(.+)", text)
-    if ritual:
-        result["ritual_kit"] = {
-            "candle": ritual.group(1).strip(),
-            "oil": ritual.group(2).strip(),
-            "crystal": ritual.group(3).strip(),
-            "herb": ritual.group(4).strip(),
-            "mini_ritual": ritual.group(5).strip()
-        }
-    # Upcoming Events
-    events = re.search(r"Upcoming Events \(You-Only\):\s*Transit Notes:\s*(.+)\nReflection:\s*(.+)", text)
+    for header, key, fields in _SECTION_FIELDS:
+        if header not in found:
+            continue
+        if fields is None:
+            result[key] = found[header]
+        elif key is None:
+            result.update(zip(fields, found[header]))
+        else:
+            result[key] = dict(zip(fields, found[header]))
+    return result
+
+# --- BULK CONVERSION ---
+def iter_checkins(lines):
+    """Yield the text of each check-in from an iterable of lines.
+
+    A new check-in starts at every line beginning with "Date:"; only the
+    check-in being read is held in memory.
+    """
+    chunk = []
+    for line in lines:
+        if line.startswith("Date:") and chunk:
+            yield "".join(chunk)
+            chunk = []
+        chunk.append(line)
+    if chunk:
+        yield "".join(chunk)
+
+# Check-in chore tags that fill a chores.to_do slot of the day document.
+_CHORE_SLOTS = {"big": "indoor_large", "indoor": "indoor_large", "small": "indoor_small",
+                "outdoor": "outdoor", "plants": "plants"}
+
+def to_day_document(record):
+    """Map parse_text output onto the planner day schema (schema.json).
+
+    Provisional: the check-in format has no agreed mapping to the day schema
+    yet, so this one may change. Ritual Kit fills rituals.checklist (Mini
+    Ritual becomes rituals.notes), Transit Notes the horoscope transit
+    summary, Reflection the first evening prompt and Creative Flow
+    horoscope.creative_flow. The Kitchen Witch Tip has no matching meal
+    fields, so its lines are kept as labelled text in kitchen.notes. Chores
+    tagged big, small, outdoor or plants go to chores.to_do, [avoid] and
+    [laundry] to chores.avoid and chores.laundry_focus, and any other tag to
+    the horoscope task list.
+    """
+    day = {key: record[key] for key in ("date", "moon_phase_sign", "day_planet") if key in record}
+    horoscope = {}
+    events = record.get("upcoming_events")
     if events:
-        result["upcoming_events"] = {
-            "transit_notes": events.group(1).strip(),
-            "reflection": events.group(2).strip()
+        horoscope["transit_summary"] = [events["transit_notes"]]
+    kit = record.get("ritual_kit")
+    if kit:
+        day["rituals"] = {
+            "checklist": {"candle": kit["candle"], "oil": kit["oil"], "crystal": kit["crystal"],
+                          "herb_incense": kit["herb"]},
+            "notes": kit["mini_ritual"],
         }
-    # Housewitch Chore
-    chores = re.findall(r"Housewitch Chore of the Day:\s*((?:[\s\S]*?)(?=Kitchen Witch Tip:|$))", text)
+    chores, to_do, tasks = {}, {}, []
+    for chore in record.get("housewitch_chore", []):
+        tag, task = chore["tag"].lower(), chore["task"]
+        if tag in _CHORE_SLOTS:
+            slot = _CHORE_SLOTS[tag]
+            to_do[slot] = f"{to_do[slot]}; {task}" if slot in to_do else task
+        elif tag == "avoid":
+            chores.setdefault("avoid", []).append(task)
+        elif tag == "laundry":
+            chores["laundry_focus"] = task
+        else:
+            tasks.append(f"{task} ({chore['tag']})")
+    if to_do:
+        chores["to_do"] = to_do
     if chores:
-        chore_lines = [line for line in chores[0].split('\n') if line.strip() and line.strip().startswith('[')]
-        result["housewitch_chore"] = []
-        for line in chore_lines:
-            m = re.match(r"\[(.+?)\]\s*(.+)", line)
-            if m:
-                result["housewitch_chore"].append({"tag": m.group(1).strip(), "task": m.group(2).strip()})
-    # Kitchen Witch
-    kitchen = re.search(r"Kitchen Witch Tip:\s*Idea:\s*(.+)\nIngredient:\s*(.+)\nTreat:\s*(.+)\nNotes:\s*(.*)", text)
-    if kitchen:
-        result["kitchen_witch"] = {
-            "idea": kitchen.group(1).strip(),
-            "ingredient": kitchen.group(2).strip(),
-            "treat": kitchen.group(3).strip(),
-            "notes": kitchen.group(4).strip()
-        }
-    # Creative Flow
-    creative = re.search(r"Creative Flow of the Day:\s*Project:\s*(.+)\nMode:\s*(.+)\nTime Box:\s*(.+)\nBonus:\s*(.+)", text)
-    if creative:
-        result["creative_flow"] = {
-            "project": creative.group(1).strip(),
-            "mode": creative.group(2).strip(),
-            "time_box": creative.group(3).strip(),
-            "bonus": creative.group(4).strip()
-        }
-    return result
+        day["chores"] = chores
+    if tasks:
+        horoscope["task_list"] = tasks
+    if "creative_flow" in record:
+        horoscope["creative_flow"] = record["creative_flow"]
+    if horoscope:
+        day["horoscope"] = horoscope
+    tip = record.get("kitchen_witch")
+    if tip:
+        lines = [f"{label}: {tip[field]}" for label, field in
+                 (("Idea", "idea"), ("Ingredient", "ingredient"), ("Treat", "treat"), ("Notes", "notes")) if tip[field]]
+        if lines:
+            day["kitchen"] = {"notes": "; ".join(lines)}
+    if events:
+        day["evening_reflection"] = {"prompt1": events["reflection"]}
+    return day
+
+def convert_bulk(in_stream, out_stream, schema=None):
+    """Parse every check-in from in_stream and write one day document per line.
+
+    Records are mapped with to_day_document, so the output feeds
+    generate_planner_pdf.py --batch. With a schema, records that fail
+    validation are reported on stderr and skipped. Returns (records written,
+    records skipped).
+    """
+    if schema is not None:
+        from validate_json import check_json
+    written = skipped = 0
+    for index, chunk in enumerate(iter_checkins(in_stream), 1):
+        if not chunk.strip():
+            continue
+        record = parse_text(chunk)
+        if record:
+            record = to_day_document(record)
+        if not record:
+            skipped += 1
+            print(f"[WARN] check-in {index}: no recognised sections, skipped", file=sys.stderr)
+            continue
+        if schema is not None:
+            errors = check_json(record, schema)
+            if errors:
+                skipped += 1
+                label = record.get("date", f"check-in {index}")
+                print(f"[ERROR] {label}: " + "; ".join(str(e) for e in errors), file=sys.stderr)
+                continue
+        out_stream.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        written += 1
+    return written, skipped
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Convert daily check-in text to JSON")
+    parser.add_argument('--bulk', action='store_true',
+                        help='Read many check-ins (split on "Date:" lines) and write JSONL day documents '
+                             '(schema.json layout, ready for generate_planner_pdf.py --batch; the field '
+                             'mapping is provisional)')
+    parser.add_argument('--input', help='Read check-in text from this file instead of stdin')
+    parser.add_argument('--output', help='Write output to this file instead of stdout')
+    parser.add_argument('--validate', metavar='SCHEMA', help='With --bulk, validate each record against this schema and skip failures')
+    args = parser.parse_args()
+    if args.validate and not args.bulk:
+        parser.error("--validate requires --bulk")
+    return args
 
 def main():
-    print("Paste your daily check-in text below. End input with Ctrl+D (Unix/macOS) or Ctrl+Z (Windows) and Enter.")
-    input_text = sys.stdin.read()
-    json_obj = parse_text(input_text)
-    print(json.dumps(json_obj, indent=2, ensure_ascii=False))
+    args = get_args()
+    in_stream = open(args.input, 'r', encoding='utf-8') if args.input else sys.stdin
+    out_stream = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        if args.bulk:
+            schema = None
+            if args.validate:
+                from validate_json import load_schema
+                schema = load_schema(args.validate)
+            written, skipped = convert_bulk(in_stream, out_stream, schema)
+            print(f"Converted {written} check-ins, skipped {skipped}.", file=sys.stderr)
+            sys.exit(1 if skipped else 0)
+        if not args.input:
+            print("Paste your daily check-in text below. End input with Ctrl+D (Unix/macOS) or Ctrl+Z (Windows) and Enter.")
+        input_text = in_stream.read()
+        json_obj = parse_text(input_text)
+        out_stream.write(json.dumps(json_obj, indent=2, ensure_ascii=False) + "\n")
+    finally:
+        if in_stream is not sys.stdin:
+            in_stream.close()
+        if out_stream is not sys.stdout:
+            out_stream.close()
 
 if __name__ == "__main__":
     main()
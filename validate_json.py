@@ -1,7 +1,36 @@
+import argparse
 import json
 import sys
 import os
-from jsonschema import validate, ValidationError, Draft7Validator
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+# Compiled validators, keyed by schema file (path, mtime, size) or by the
+# content hash of an in-memory schema; schema dicts are treated as read-only
+# once compiled. jsonschema is imported, and the schema itself checked, only
+# when a Draft 7 validator is first needed: for an invalid document, for a
+# schema the plain pre-check cannot express, or through get_validator.
+# The last few schema dicts seen are also remembered by identity, which skips
+# hashing them again; each holds its dict alive, so that LRU stays small.
+_VALIDATORS = {}
+_VALIDATORS_BY_ID = OrderedDict()
+_BY_ID_LOCK = threading.Lock()
+BY_ID_ENTRIES = 8
+_SCHEMA_FILES = {}
+
+class ValidationIssue(namedtuple('ValidationIssue', 'path pointer message')):
+    """One schema violation: dotted path, JSON pointer and the validator message."""
+    __slots__ = ()
+
+    def __str__(self):
+        return f"{self.path}: {self.message}"
+
+class SchemaValidationError(ValueError):
+    """Raised by require_valid; .errors holds the ValidationIssue list."""
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"JSON validation failed with {len(errors)} error(s): {errors[0]}")
 
 def load_json(path):
     try:
@@ -11,37 +40,299 @@ def load_json(path):
         print(f"[ERROR] Failed to read JSON file: {e}")
         sys.exit(1)
 
+def read_schema(path):
+    """Return the parsed schema file, re-reading it only when its mtime or size changes."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    schema = _SCHEMA_FILES.get(key)
+    if schema is None:
+        with open(path, 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+        _SCHEMA_FILES[key] = schema
+    return schema
+
 def load_schema(path):
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return read_schema(path)
     except Exception as e:
         print(f"[ERROR] Failed to read schema file: {e}")
         sys.exit(1)
 
-def validate_json(data, schema):
+# Keywords the compiled pre-check understands. Schemas using anything else
+# (formats, patterns, $ref, ...) are pre-checked with jsonschema instead.
+_FAST_KEYWORDS = {'type', 'required', 'properties', 'additionalProperties', 'items', 'title', 'description', '$schema', '$id'}
+_TYPE_CHECKS = {
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list),
+    'string': lambda v: isinstance(v, str),
+    'integer': lambda v: (isinstance(v, int) and not isinstance(v, bool)) or (isinstance(v, float) and v.is_integer()),
+    'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    'boolean': lambda v: isinstance(v, bool),
+    'null': lambda v: v is None,
+}
+
+def compile_check(schema):
+    """Compile a schema into a plain predicate, or return None if it uses other keywords.
+
+    Besides annotations, only type, properties, required,
+    additionalProperties and items are supported; day_model builds its
+    strict pass on the same predicates.
+    """
+    if schema is True or schema == {}:
+        return lambda v: True
+    if schema is False:
+        return lambda v: False
+    if not isinstance(schema, dict) or not set(schema) <= _FAST_KEYWORDS:
+        return None
+    type_checks = ()
+    if 'type' in schema:
+        types = [schema['type']] if isinstance(schema['type'], str) else schema['type']
+        if not all(t in _TYPE_CHECKS for t in types):
+            return None
+        type_checks = tuple(_TYPE_CHECKS[t] for t in types)
+    properties = {}
+    for key, sub in schema.get('properties', {}).items():
+        properties[key] = compile_check(sub)
+        if properties[key] is None:
+            return None
+    required = tuple(schema.get('required', ()))
+    additional = schema.get('additionalProperties', True)
+    additional_check = None
+    if additional is not True and additional is not False:
+        additional_check = compile_check(additional)
+        if additional_check is None:
+            return None
+    items_check = None
+    if 'items' in schema:
+        items_check = compile_check(schema['items']) if not isinstance(schema['items'], list) else None
+        if items_check is None:
+            return None
+
+    def check(value):
+        if type_checks and not any(t(value) for t in type_checks):
+            return False
+        if isinstance(value, dict):
+            for key in required:
+                if key not in value:
+                    return False
+            for key, item in value.items():
+                sub = properties.get(key)
+                if sub is not None:
+                    if not sub(item):
+                        return False
+                elif additional is False:
+                    return False
+                elif additional_check is not None and not additional_check(item):
+                    return False
+        elif items_check is not None and isinstance(value, list):
+            for item in value:
+                if not items_check(item):
+                    return False
+        return True
+    return check
+
+def _entry(schema):
+    """Return the [schema, validator or None, pre-check or None] cache entry for a schema dict or path."""
+    if isinstance(schema, (str, os.PathLike)):
+        schema = read_schema(schema)
+    cached = recall_by_id(_VALIDATORS_BY_ID, schema)
+    if cached is not None:
+        return cached
+    key = hashlib.sha256(json.dumps(schema, sort_keys=True).encode('utf-8')).hexdigest()
+    entry = _VALIDATORS.get(key)
+    if entry is None:
+        entry = _VALIDATORS[key] = [schema, None, compile_check(schema)]
+    remember_by_id(_VALIDATORS_BY_ID, schema, entry)
+    return entry
+
+def recall_by_id(cache, schema):
+    """Return the entry an identity LRU holds for the schema dict, or None."""
+    with _BY_ID_LOCK:
+        cached = cache.get(id(schema))
+        if cached is None or cached[0] is not schema:
+            return None
+        cache.move_to_end(id(schema))
+        return cached[1]
+
+def remember_by_id(cache, schema, entry):
+    """Record entry for the schema dict in an identity LRU of BY_ID_ENTRIES entries."""
+    with _BY_ID_LOCK:
+        cache[id(schema)] = (schema, entry)
+        cache.move_to_end(id(schema))
+        while len(cache) > BY_ID_ENTRIES:
+            cache.popitem(last=False)
+
+def _compiled(schema):
+    """Return (validator, pre-check predicate) for a schema dict or schema file path."""
+    entry = _entry(schema)
+    if entry[1] is None:
+        from jsonschema import Draft7Validator
+        Draft7Validator.check_schema(entry[0])
+        entry[1] = Draft7Validator(entry[0])
+        if entry[2] is None:
+            entry[2] = entry[1].is_valid
+    return entry[1], entry[2]
+
+def _pre_check(schema):
+    entry = _entry(schema)
+    return entry[2] if entry[2] is not None else _compiled(schema)[1]
+
+def get_validator(schema):
+    """Return the compiled Draft 7 validator for a schema dict or schema file path."""
+    return _compiled(schema)[0]
+
+def _pointer(parts):
+    return ''.join('/' + str(p).replace('~', '~0').replace('/', '~1') for p in parts)
+
+def is_valid(data, schema):
+    """Fast boolean check; stops at the first violation."""
+    return _pre_check(schema)(data)
+
+def check_json(data, schema):
+    """Return the sorted ValidationIssue list for data (empty when valid).
+
+    Well-formed documents only pay for the boolean pre-check; the full error
+    collection runs only when that fails.
+    """
+    if _pre_check(schema)(data):
+        return []
+    validator = _compiled(schema)[0]
     # The 'horoscope' field is optional, so validation will pass if it is missing
-    validator = Draft7Validator(schema)
     errors = sorted(validator.iter_errors(data), key=lambda e: e.path)
+    return [ValidationIssue('.'.join([str(p) for p in error.path]), _pointer(error.path), error.message) for error in errors]
+
+def require_valid(data, schema):
+    """Raise SchemaValidationError unless data matches schema."""
+    errors = check_json(data, schema)
+    if errors:
+        raise SchemaValidationError(errors)
+
+def collect_errors(data, schema):
+    """Return validation errors as "path: message" strings (empty when valid)."""
+    return [str(error) for error in check_json(data, schema)]
+
+def validate_json(data, schema):
+    errors = collect_errors(data, schema)
     if errors:
         print("[ERROR] JSON validation failed:")
         for error in errors:
-            path = '.'.join([str(p) for p in error.path])
-            print(f"- {path}: {error.message}")
+            print(f"- {error}")
         sys.exit(1)
 
+# --- STREAMING JSONL VALIDATION ---
+JSONL_CHUNK_LINES = 500
+# Schema path for worker processes; set once by _init_worker.
+_WORKER_SCHEMA = None
+
+def _init_worker(schema_path):
+    global _WORKER_SCHEMA
+    _WORKER_SCHEMA = read_schema(schema_path)
+    _pre_check(_WORKER_SCHEMA)
+
+def validate_lines(first_lineno, lines, schema):
+    """Validate a chunk of JSONL lines.
+
+    Returns (records checked, invalid records, report entries) where each entry
+    is a dict with the line number, JSON pointer and message of one error.
+    """
+    checked = invalid = 0
+    report = []
+    for lineno, line in enumerate(lines, first_lineno):
+        if not line.strip():
+            continue
+        checked += 1
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            invalid += 1
+            report.append({"line": lineno, "pointer": "", "message": f"invalid JSON: {e}"})
+            continue
+        errors = check_json(data, schema)
+        if errors:
+            invalid += 1
+            report.extend({"line": lineno, "pointer": error.pointer, "message": error.message} for error in errors)
+    return checked, invalid, report
+
+def _validate_lines_in_worker(first_lineno, lines):
+    return validate_lines(first_lineno, lines, _WORKER_SCHEMA)
+
+def _iter_chunks(stream, size):
+    chunk = []
+    first = 1
+    for lineno, line in enumerate(stream, 1):
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield first, chunk
+            first, chunk = lineno + 1, []
+    if chunk:
+        yield first, chunk
+
+def validate_jsonl(stream, schema_path, report_file=None, workers=1, chunk_lines=JSONL_CHUNK_LINES):
+    """Validate newline-delimited JSON from stream against one compiled schema.
+
+    Lines are read and validated in fixed-size chunks, so memory stays flat
+    regardless of input size. Error entries are written to report_file as
+    JSONL in input order. Returns (records checked, invalid records, errors).
+    """
+    checked = invalid = errors = 0
+    chunks = _iter_chunks(stream, chunk_lines)
+    if workers > 1:
+        from planner_pool import make_pool, ordered_map
+        pool = make_pool(workers, _init_worker, (schema_path,))
+        results = ordered_map(pool, _validate_lines_in_worker, chunks, window=workers * 2)
+    else:
+        pool = None
+        schema = read_schema(schema_path)
+        results = (validate_lines(first, lines, schema) for first, lines in chunks)
+    try:
+        for chunk_checked, chunk_invalid, report in results:
+            checked += chunk_checked
+            invalid += chunk_invalid
+            errors += len(report)
+            if report_file is not None:
+                for entry in report:
+                    report_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return checked, invalid, errors
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Validate planner JSON against the day schema")
+    parser.add_argument('input', help='Input JSON file (or JSONL file / - for stdin with --jsonl)')
+    parser.add_argument('schema', help='Schema JSON file')
+    parser.add_argument('--jsonl', action='store_true', help='Treat input as newline-delimited JSON and validate every record')
+    parser.add_argument('--workers', type=int, default=1, help='Validate --jsonl chunks on N worker processes (default: 1)')
+    parser.add_argument('--report', help='Write --jsonl errors as JSONL (line, pointer, message) to this file, or - for stdout')
+    return parser.parse_args()
+
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python validate_json.py <input_json> <schema_json>")
-        sys.exit(1)
-    input_path = sys.argv[1]
-    schema_path = sys.argv[2]
-    if not os.path.exists(input_path):
+    args = get_args()
+    input_path = args.input
+    schema_path = args.schema
+    if input_path != '-' and not os.path.exists(input_path):
         print(f"[ERROR] Input file not found: {input_path}")
         sys.exit(1)
     if not os.path.exists(schema_path):
         print(f"[ERROR] Schema file not found: {schema_path}")
         sys.exit(1)
+    if args.jsonl:
+        load_schema(schema_path)
+        report_file = None
+        if args.report == '-':
+            report_file = sys.stdout
+        elif args.report:
+            report_file = open(args.report, 'w', encoding='utf-8')
+        stream = sys.stdin if input_path == '-' else open(input_path, 'r', encoding='utf-8')
+        try:
+            checked, invalid, errors = validate_jsonl(stream, schema_path, report_file, args.workers)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if report_file not in (None, sys.stdout):
+                report_file.close()
+        print(f"Validated {checked} records: {invalid} invalid, {errors} errors.", file=sys.stderr if report_file is sys.stdout else sys.stdout)
+        sys.exit(1 if invalid else 0)
     data = load_json(input_path)
     schema = load_schema(schema_path)
     validate_json(data, schema)